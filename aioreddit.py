@@ -0,0 +1,126 @@
+import asyncio
+import logging
+
+import auth
+import config
+import metrics
+import ratelimit
+import reddit
+import retry
+
+# asyncio versions of the reddit.py calls made by the busiest jobs (post discovery and the PM outbox), used when
+# config.runtime is 'asyncio'. asyncpraw is only needed, and imported, in that mode (see requirements-asyncio.txt).
+# Number updates and draws are not mirrored: they harvest comments through praw and talk to pastebin, and still run in
+# the async_thread_workers pool.
+_reddit = None
+_api_errors = None
+
+
+def client():
+    """ Returns: [object] asyncpraw.Reddit of the bot account, created on first use inside the event loop"""
+    global _reddit
+    if _reddit is None:
+        import asyncpraw
+        _reddit = asyncpraw.Reddit(user_agent=auth.my_user_agent,
+                                   client_id=auth.my_client_id,
+                                   client_secret=auth.my_client_secret,
+                                   username=auth.my_username,
+                                   password=auth.my_password)
+        ratelimit.track(_reddit.auth)
+    return _reddit
+
+
+def api_errors():
+    """ Returns: [tuple] of asyncpraw / asyncprawcore exceptions retried by call()"""
+    global _api_errors
+    if _api_errors is None:
+        from asyncprawcore.exceptions import AsyncPrawcoreException
+        from asyncpraw.exceptions import AsyncPRAWException
+        _api_errors = (AsyncPRAWException, AsyncPrawcoreException)
+    return _api_errors
+
+
+async def call(action, identifier, requester, tries=0, retries=None):
+    """ retry.call for coroutines, waits between attempts with asyncio.sleep so other jobs keep running.
+        Parameters:
+            action:     [function] without arguments returning the awaitable API call(s)
+            identifier: [string] unique 6 digit
+            requester:  [string] redditor doing giveaway
+            tries:      [int] attempts already made
+            retries:    [int] maximum number of attempts, config.retries by default
+        Returns: result of action, None if all attempts failed"""
+    if retries is None:
+        retries = config.retries
+    while tries < retries:
+        await ratelimit.budget.acquire_async()
+        try:
+            return await action()
+        except api_errors() as error:
+            wait = retry.wait_time(tries, error)
+            tries += 1
+            logging.error("%s:%s: %s", identifier, requester, error)
+            metrics.api_retries.inc(error=type(error).__name__)
+            if retry.rate_limit_wait(error):
+                metrics.api_rate_limited.inc()
+            if retry.budget_wait(error):  # an action RATELIMIT only delays this call, through wait
+                ratelimit.budget.pause(retry.budget_wait(error))
+            if tries >= retries:
+                break
+            if wait > config.max_wait_time:
+                logging.error("%s:%s: reddit asked to wait %.0f seconds, not retrying.", identifier, requester, wait)
+                break
+            logging.info("%s:%s: waiting %.0f seconds before retrying. Retry #: %s", identifier, requester, wait, tries)
+            await asyncio.sleep(wait)
+        finally:
+            ratelimit.update()
+    return None
+
+
+async def recent_submissions(requester, identifier):
+    """ reddit.recent_submissions on the event loop.
+        Returns: [list] of the newest config.submissions_limit posts of requester, None if they could not be fetched"""
+    async def fetch():
+        redditor = await client().redditor(requester)
+        return [post async for post in redditor.submissions.new(limit=config.submissions_limit)]
+
+    # a single attempt per run, the next post check is the retry
+    return await call(fetch, identifier, requester, retries=1)
+
+
+async def check_post(requester, identifier, giveaway_args, codes):
+    """ reddit.check_post on the event loop, scheduling the found giveaway still runs in a worker thread.
+        Returns: True / False"""
+    logging.info("%s:%s: Checking for giveaway post...", identifier, requester)
+    submissions = await recent_submissions(requester, identifier)
+
+    if submissions is not None:
+        giveaway_post = reddit.find_giveaway_post(submissions, identifier, requester)
+        if giveaway_post:
+            # giveaway.schedule comments through praw, hand it a praw submission
+            await asyncio.get_running_loop().run_in_executor(
+                None, reddit.giveaway_post_found, requester, identifier, giveaway_args, codes,
+                reddit.get_post(giveaway_post.id))
+        return True
+    else:
+        logging.error("%s%s: Unable to check for giveaway post.", identifier, requester)
+        return False
+
+
+async def send_pm(recipient, subject, message, identifier, requester, tries=0):
+    """ reddit.send_pm on the event loop, failed PMs are left to the caller (the outbox) to retry.
+        Returns: True / False"""
+    async def send():
+        redditor = await client().redditor(recipient)
+        # message() returns nothing on success
+        return await redditor.message(subject=subject, message=message + config.footer_message) or True
+
+    sent = await call(send, identifier, requester, tries=tries)
+
+    if sent:
+        logging.info("%s:%s: PM sent to: %s", identifier, requester, recipient)
+        metrics.pms.inc(result='sent')
+        return True
+    else:
+        logging.error("%s:%s: Failed to send PM to: %s", identifier, requester, recipient)
+        metrics.pms.inc(result='failed')
+        return False
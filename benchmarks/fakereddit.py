@@ -0,0 +1,392 @@
+""" In-memory stand-ins for praw.Reddit and PastebinAPI, to run giveaways without reddit or pastebin.
+    Install them with reddit.use_client(FakeReddit(...)) and utils.use_pastebin(FakePastebin()).
+    Every API request is counted in FakeReddit.calls, takes latency seconds and fails with error_rate probability
+    the way praw does (ClientException), so retries and the API budget are exercised too."""
+import collections
+import copy
+import itertools
+import math
+import os
+import random
+import string
+import tempfile
+import threading
+import time
+
+from praw.exceptions import ClientException
+from praw.models import MoreComments
+
+page_size = 200  # top level comments in the first page of a post, like reddit
+more_size = 100  # comments loaded by each "load more comments" request
+
+
+class FakeReddit(object):
+    """ Offline reddit holding posts, comments and redditors in memory.
+        Parameters:
+            latency:    [float] (in seconds) time each API request takes
+            error_rate: [float] share of API requests failing with ClientException
+            seed:       [int] random seed of the synthesized content"""
+
+    def __init__(self, latency=0.0, error_rate=0.0, seed=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.calls = collections.Counter()  # request kind -> count
+        self.posts = collections.OrderedDict()  # id -> FakeSubmission, oldest first
+        self.comments = {}  # id -> FakeComment made by the bot
+        self.sent = []  # (recipient, subject, message) of every PM
+        self.unread = []  # inbox items returned by inbox.unread()
+        self.inbox = FakeInbox(self)
+        self.auth = FakeAuth(self)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def request(self, kind):
+        """ One API request: counted, delayed by latency, failing with error_rate probability."""
+        with self._lock:
+            self.calls[kind] += 1
+            failed = self.error_rate and self.random.random() < self.error_rate
+        if self.latency:
+            time.sleep(self.latency)
+        if failed:
+            raise ClientException('fake reddit: injected %s failure' % kind)
+
+    def new_id(self):
+        with self._lock:
+            number = next(self._ids)
+        digits = []
+        while number:
+            number, digit = divmod(number, 36)
+            digits.append((string.digits + string.ascii_lowercase)[digit])
+        return ''.join(reversed(digits)).rjust(6, '0')
+
+    def comment(self, id):
+        return self.comments[id]
+
+    def submission(self, id):
+        # a new object per call like praw, its comments are loaded once on first access
+        return copy.copy(self.posts[id])
+
+    def redditor(self, name):
+        return FakeRedditor(self, name)
+
+    def subreddit(self, name):
+        return FakeSubreddit(self, name)
+
+    def make_post(self, author, title, comments=0, giveaway_type='random', minnum=0, maxnum=10000, keyword='fake',
+                  repeat_rate=0.1, deleted_rate=0.01):
+        """ Creates a giveaway post with synthetic top level comments.
+            Parameters:
+                author:         [string] reddit username of the requester
+                title:          [string] post title, include the identifier to have the post found
+                comments:       [int] number of top level comments
+                giveaway_type:  [string] random / number / keyword, decides what the comments say
+                minnum:         [int] lowest number guessed in number giveaways
+                maxnum:         [int] highest number guessed in number giveaways
+                keyword:        [string] keyword half the comments of keyword giveaways contain
+                repeat_rate:    [float] share of comments from redditors who already commented
+                deleted_rate:   [float] share of deleted comments (no author)
+            Returns: [object] FakeSubmission"""
+        post = FakeSubmission(self, self.new_id(), author, title)
+        post.giveaway = (giveaway_type, minnum, maxnum, keyword, repeat_rate, deleted_rate)
+        self.posts[post.id] = post
+        self.add_comments(post, comments)
+        return post
+
+    def add_comments(self, post, count):
+        """ Adds count synthetic top level comments to post, newer than the ones it has."""
+        giveaway_type, minnum, maxnum, keyword, repeat_rate, deleted_rate = post.giveaway
+        rand = self.random
+        created = post.top_level[-1][3] if post.top_level else post.created_utc
+        for _ in range(count):
+            created += rand.uniform(0, 2)
+            if rand.random() < deleted_rate:
+                author = None
+            elif post.top_level and rand.random() < repeat_rate:
+                author = rand.choice(post.top_level)[1] or 'user%s' % self.new_id()
+            else:
+                author = 'user%s' % self.new_id()
+            if giveaway_type == 'number':
+                body = 'My guess is %s, thanks!' % rand.randint(minnum, maxnum)
+            elif giveaway_type == 'keyword':
+                body = 'Is it %s?' % (keyword if rand.random() < 0.5 else rand.choice(['cake', 'pie', 'tea']))
+            else:
+                body = 'Count me in, thanks for the giveaway!'
+            post.top_level.append((self.new_id(), author, body, created))
+
+    def post_comment(self, parent, body):
+        """ Comment made by the bot (reply() of posts and comments)."""
+        self.request('reply')
+        post = parent if isinstance(parent, FakeSubmission) else parent.submission
+        comment = FakeComment(self, self.new_id(), FakeRedditor(self, 'autogiveaway'), body, post,
+                              time.time(), parent_id=parent.fullname)
+        self.comments[comment.id] = comment
+        return comment
+
+
+class FakeAuth(object):
+    """ Rate limit figures read by ratelimit.update(), the fake never runs out."""
+
+    def __init__(self, reddit):
+        self._reddit = reddit
+
+    @property
+    def limits(self):
+        return {'remaining': None, 'reset_timestamp': None, 'used': sum(self._reddit.calls.values())}
+
+
+class FakeInbox(object):
+
+    def __init__(self, reddit):
+        self._reddit = reddit
+
+    def unread(self, limit=None):
+        self._reddit.request('inbox')
+        return list(self._reddit.unread[:limit])
+
+    def mark_read(self, items):
+        self._reddit.request('mark_read')
+        for item in items:
+            if item in self._reddit.unread:
+                self._reddit.unread.remove(item)
+
+
+class FakeRedditor(object):
+    """ Redditor whose karma and account age are made up from the name and fetched on first access, like praw."""
+
+    def __init__(self, reddit, name):
+        self._reddit = reddit
+        self.name = name
+        self._profile = None
+        self.submissions = FakeListing(self)
+
+    def __str__(self):
+        return self.name
+
+    def __eq__(self, other):
+        return str(self).lower() == str(other).lower()
+
+    def __hash__(self):
+        return hash(self.name.lower())
+
+    def _fetch(self):
+        if self._profile is None:
+            self._reddit.request('redditor')
+            rand = random.Random(self.name)
+            self._profile = (rand.randint(0, 5000), rand.randint(0, 20000),
+                             time.time() - rand.randint(0, 3650) * 86400)
+        return self._profile
+
+    @property
+    def link_karma(self):
+        return self._fetch()[0]
+
+    @property
+    def comment_karma(self):
+        return self._fetch()[1]
+
+    @property
+    def created_utc(self):
+        return self._fetch()[2]
+
+    def message(self, subject, message):
+        self._reddit.request('message')
+        self._reddit.sent.append((self.name, subject, message))
+
+
+class FakeListing(object):
+    """ redditor.submissions"""
+
+    def __init__(self, redditor):
+        self._redditor = redditor
+
+    def new(self, limit=None):
+        reddit = self._redditor._reddit
+        reddit.request('submissions')
+        name = self._redditor.name.lower()
+        posts = [x for x in reversed(reddit.posts.values()) if x.author.name.lower() == name]
+        return iter(posts[:limit])
+
+
+class FakeSubreddit(object):
+
+    def __init__(self, reddit, name):
+        self._reddit = reddit
+        self.display_name = name
+
+    def __str__(self):
+        return self.display_name
+
+    def submit(self, title, url=None, selftext='', send_replies=True):
+        self._reddit.request('submit')
+        post = FakeSubmission(self._reddit, self._reddit.new_id(), 'autogiveaway', title, url=url,
+                              selftext=selftext)
+        self._reddit.posts[post.id] = post
+        return post
+
+
+class FakeSubmission(object):
+
+    def __init__(self, reddit, id, author, title, url=None, selftext=''):
+        self._reddit = reddit
+        self.id = id
+        self.author = FakeRedditor(reddit, author)
+        self.title = title
+        self.selftext = selftext
+        self.url = url or 'https://www.reddit.com/r/giveaways/comments/%s/' % id
+        self.permalink = '/r/giveaways/comments/%s/' % id
+        self.subreddit = FakeSubreddit(reddit, 'giveaways')
+        self.created_utc = time.time()
+        self.comment_sort = 'confidence'
+        self.top_level = []  # top level comments (id, author name, body, created_utc), oldest first
+        self.giveaway = ('random', 0, 0, '', 0, 0)
+        self._forest = None
+
+    @property
+    def fullname(self):
+        return 't3_%s' % self.id
+
+    @property
+    def comments(self):
+        """ First page of top level comments, newest first when comment_sort is 'new'."""
+        if self._forest is None:
+            self._reddit.request('comments')
+            ordered = self.top_level[::-1] if self.comment_sort == 'new' else self.top_level
+            self._forest = FakeCommentForest(self, ordered)
+        return self._forest
+
+    def reply(self, body):
+        return self._reddit.post_comment(self, body)
+
+    def load(self, rows):
+        """ Returns: [list] of new FakeComment objects of top level comment rows, like praw builds from a response"""
+        return [FakeComment(self._reddit, id, FakeRedditor(self._reddit, author) if author else None, body, self,
+                            created_utc) for id, author, body, created_utc in rows]
+
+
+class FakeCommentForest(object):
+    """ submission.comments: a page of comments and a MoreComments loading the rest, more_size at a time."""
+
+    def __init__(self, post, ordered):
+        self._items = post.load(ordered[:page_size])
+        if len(ordered) > page_size:
+            self._items.append(FakeMoreComments(post, ordered, page_size))
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+    def replace_more(self, limit=32):
+        replaced = 0
+        while self._items and isinstance(self._items[-1], FakeMoreComments) and (limit is None or replaced < limit):
+            self._items[-1:] = self._items[-1].comments()
+            replaced += 1
+        return []
+
+
+class FakeMoreComments(MoreComments):
+    """ "load more comments" entry, praw's MoreComments so reddit.py tells it apart from comments."""
+
+    # noinspection PyMissingConstructor
+    def __init__(self, post, ordered, start):
+        self._post = post
+        self._ordered = ordered
+        self._start = start
+        self.parent_id = post.fullname
+        self.count = len(ordered) - start
+        self.children = []
+        self.submission = post
+
+    def __repr__(self):
+        return '<FakeMoreComments count=%s>' % self.count
+
+    def comments(self, update=True):
+        self._post._reddit.request('morechildren')
+        end = self._start + more_size
+        page = self._post.load(self._ordered[self._start:end])
+        if end < len(self._ordered):
+            page.append(FakeMoreComments(self._post, self._ordered, end))
+        return page
+
+
+class FakeComment(object):
+
+    def __init__(self, reddit, id, author, body, submission, created_utc, parent_id=None, stickied=False):
+        self._reddit = reddit
+        self.id = id
+        self.author = author
+        self.body = body
+        self.stickied = stickied
+        self.submission = submission
+        self.created_utc = created_utc
+        self.parent_id = parent_id or submission.fullname
+        self.subreddit = submission.subreddit
+
+    @property
+    def fullname(self):
+        return 't1_%s' % self.id
+
+    def edit(self, body):
+        self._reddit.request('edit')
+        self.body = body
+        return self
+
+    def reply(self, body):
+        return self._reddit.post_comment(self, body)
+
+
+class FakePastebin(object):
+    """ PastebinAPI keeping pastes in memory.
+        Parameters:
+            latency:    [float] (in seconds) time each request takes"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.pastes = {}  # code -> text
+        self.calls = collections.Counter()
+        self._codes = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _request(self, kind):
+        with self._lock:
+            self.calls[kind] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def paste(self, api_dev_key, api_paste_code, api_user_key=None, paste_name=None, paste_format=None,
+              paste_private=None, paste_expire_date=None):
+        self._request('paste')
+        with self._lock:
+            code = 'fake%04d' % next(self._codes)
+            self.pastes[code] = api_paste_code
+        return 'https://pastebin.com/%s' % code
+
+    def delete_paste(self, api_dev_key, api_user_key, api_paste_key):
+        self._request('delete')
+        with self._lock:
+            self.pastes.pop(api_paste_key, None)
+
+
+def offline_config():
+    """ Points config at a throwaway database and lifts the PM and API throttles, for runs against the fakes.
+        Call it before importing utils, which sets up the scheduler, outbox and API budget from config."""
+    import config
+    config.database = os.path.join(tempfile.mkdtemp(prefix='autogiveaway-benchmark-'), 'benchmark.sqlite')
+    config.profile_cache_db = None
+    config.wait_time = 0.1
+    config.wait_jitter = 0
+    config.pm_per_minute = 10 ** 6
+    config.api_requests_per_minute = 10 ** 7
+    config.api_burst = 10 ** 4
+
+
+def api_calls(reddit):
+    """ Returns: [int] API requests made to the fake so far"""
+    return sum(reddit.calls.values())
+
+
+def expected_fetch_calls(comments):
+    """ Returns: [int] requests needed to load every top level comment of a post"""
+    return 1 + max(0, math.ceil((comments - page_size) / more_size))
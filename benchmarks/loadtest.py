@@ -0,0 +1,98 @@
+""" Runs many giveaways at once against benchmarks.fakereddit and reports draw latency and throughput.
+    Every giveaway gets its own synthetic post, number giveaways also get their numbers comment updated first.
+    Usage: python -m benchmarks.loadtest [--giveaways N] [--comments N] [--concurrency N] [--latency S]
+                                         [--error-rate R] [--updates N]"""
+import argparse
+import concurrent.futures
+import datetime
+import logging
+import random
+import time
+
+import config
+from benchmarks import fakereddit
+
+fakereddit.offline_config()  # before utils sets up the scheduler, outbox and budget
+
+import giveaway  # noqa: E402
+import outbox  # noqa: E402
+import reddit  # noqa: E402
+import utils  # noqa: E402
+from benchmarks.fakereddit import FakePastebin, FakeReddit, api_calls  # noqa: E402
+from spec import GiveawayArgs  # noqa: E402
+
+types = ('random', 'number', 'keyword')
+
+
+def make_giveaway(fake, number, comments):
+    """ Returns: (requester, identifier, giveaway_args, codes, post, bot_comment) of a synthetic giveaway"""
+    giveaway_type = types[number % len(types)]
+    requester = 'requester%s' % number
+    identifier = '%06d' % random.randint(0, 999999)
+    post = fake.make_post(requester, '[%s] Loadtest giveaway' % identifier, comments, giveaway_type,
+                          minnum=0, maxnum=10000, keyword='loadtest')
+    bot_comment = post.reply('Giveaway set up.')
+    winners = 3
+    codes = ['CODE-%s-%s' % (identifier, x) for x in range(winners)]
+    giveaway_args = GiveawayArgs(giveaway_type, datetime.datetime.utcnow(), guessnum=5000, minnum=0, maxnum=10000,
+                                 keyword='loadtest', winners=winners, pkarma=10 if number % 2 else 0)
+    return requester, identifier, giveaway_args, codes, post, bot_comment
+
+
+def run_giveaway(fake, giveaway_data, updates, new_comments):
+    """ Returns: [float] (in seconds) time from the start of the draw until its comment was edited"""
+    requester, identifier, giveaway_args, codes, post, bot_comment = giveaway_data
+    if giveaway_args.giveaway_type == 'number':
+        for _ in range(updates):
+            utils.update_numbers(requester, identifier, giveaway_args, post, bot_comment)
+            fake.add_comments(post, new_comments)
+    start = time.perf_counter()
+    giveaway.process(requester, identifier, giveaway_args, codes, post, bot_comment)
+    return time.perf_counter() - start
+
+
+def percentile(values, share):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * share))]
+
+
+def run(giveaways, comments, concurrency, latency, error_rate, updates):
+    fake = FakeReddit(latency=latency, error_rate=error_rate, seed=1)
+    pastes = FakePastebin(latency=latency)
+    reddit.use_client(fake)
+    utils.use_pastebin(pastes)
+
+    print('Synthesizing %s giveaways of %s comments...' % (giveaways, comments))
+    data = [make_giveaway(fake, x, comments) for x in range(giveaways)]
+    setup_calls = api_calls(fake)
+
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        durations = list(executor.map(lambda x: run_giveaway(fake, x, updates, max(comments // 10, 1)), data))
+    drawn = time.perf_counter() - start
+    # drains started during the draws skip PMs queued while another drain was sending
+    outbox.drain()
+    elapsed = time.perf_counter() - start
+
+    print('giveaways:   %s in %.2f s, %.2f giveaways/s (%.2f s with PMs delivered)' %
+          (giveaways, drawn, giveaways / drawn, elapsed))
+    print('draw time:   p50 %.3f s  p95 %.3f s  p99 %.3f s  max %.3f s' %
+          (percentile(durations, 0.5), percentile(durations, 0.95), percentile(durations, 0.99), max(durations)))
+    print('API calls:   %s (%s)' % (api_calls(fake) - setup_calls,
+                                    ', '.join('%s %s' % x for x in sorted(fake.calls.items()))))
+    print('pastebin:    %s' % ', '.join('%s %s' % x for x in sorted(pastes.calls.items())))
+    print('PMs sent:    %s' % len(fake.sent))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Giveaway load test against an in-memory reddit.')
+    parser.add_argument('--giveaways', type=int, default=300)
+    parser.add_argument('--comments', type=int, default=1000, help='top level comments per post')
+    parser.add_argument('--concurrency', type=int, default=config.heavy_workers, help='draws run at the same time')
+    parser.add_argument('--latency', type=float, default=0.005, help='seconds per API request')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of failing API requests')
+    parser.add_argument('--updates', type=int, default=2, help='numbers comment updates before number draws')
+    options = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+    run(options.giveaways, options.comments, options.concurrency, options.latency, options.error_rate,
+        options.updates)
@@ -0,0 +1,47 @@
+""" Parse throughput of utils.parse_pm over the message formats from the README.
+    Usage: python -m benchmarks.parse_pm [iterations]"""
+import datetime
+import logging
+import sys
+import time
+
+import utils
+
+year = datetime.date.today().year + 1  # dates must be in the future
+corpus = [
+    'random, in 24 hours, 2, pkarma:100, ckarma:100, days:30, GAME-CODE-1 GAME-CODE-2',
+    'number:123:0:10000, 15 february %s, 3, pkarma:50, ckarma:100, days:365, GAME-CODE-1 GAME-CODE-2 '
+    '[GAME-CODE-3E GAME-3-DLCE]' % year,
+    'keyword:guess this, friday 24 february %s 5:00 pm EST, pkarma:25, ckarma:50, days:3, GAME-CODE-1' % year,
+    'random, in 48 hours, 2, GAME-CODE-1-HERE GAME-CODE-2',
+    'number 1:0:1000, 21 february %s 7:00 pm PST, GAME-CODE-1 GAME-CODE-2' % year,
+    'keyword:lolipop, in 12 hours, GAME-CODE-1',
+    'random, in 48 hours, 2, "xbox one" "battlefiedl 1"',
+    'in 24 hours, "GFX 9000"',
+    '/u/autogiveaway random',
+    '/u/autogiveaway random, 2, pkarma:50, ckarma:10, days:45',
+    '/u/autogiveaway number:234:0:1000',
+    '/u/autogiveaway keyword:test, 2',
+    'random, yesterday, GAME-CODE-1',
+    'number:abc, in 24 hours, GAME-CODE-1',
+]
+
+
+def run(iterations):
+    total = 0
+    for message in corpus:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            try:
+                result = utils.parse_pm(message, 'benchmark', 'benchmark')
+            except utils.ParseError as error:
+                result = error
+        elapsed = time.perf_counter() - start
+        total += elapsed
+        print('%10.0f msg/s  %-12s %s' % (iterations / elapsed, type(result).__name__, message[:60]))
+    print('%10.0f msg/s  overall' % (iterations * len(corpus) / total))
+
+
+if __name__ == '__main__':
+    logging.disable(logging.CRITICAL)
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
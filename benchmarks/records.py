@@ -0,0 +1,56 @@
+""" Checks that the compact comment records unique_users keeps give the draws the same answers as the full comments:
+    the keyword length rule (len(body) < comment_character_limit) and the first number of number giveaways, for
+    bodies around the length limit and numbers past the stored part of the body.
+    Usage: python -m benchmarks.records
+    Exits with 1 when a record answers differently from its full comment."""
+import logging
+import re
+import sys
+
+from benchmarks import fakereddit
+
+fakereddit.offline_config()
+
+import config  # noqa: E402
+import reddit  # noqa: E402
+from benchmarks.fakereddit import FakeComment, FakeReddit, FakeRedditor  # noqa: E402
+
+
+def bodies():
+    limit = config.comment_character_limit
+    prefix = max(config.comment_body_prefix, limit)
+    for length in (0, 1, limit - 1, limit, limit + 1, prefix - 1, prefix, prefix + 1, 5 * prefix):
+        yield 'fake ' + 'x' * max(length - 5, 0) if length >= 5 else 'x' * length
+    # numbers before, across and after the end of the stored body
+    for position in (0, limit - 1, prefix - 2, prefix - 1, prefix, prefix + 1, 3 * prefix):
+        yield 'x' * position + '4242 and 7'
+    yield 'no number ' + 'y' * (2 * prefix)
+    yield '%s %s' % ('y' * (2 * prefix), 12345678901234567890)
+
+
+def answers(body):
+    """ Returns: [tuple] of what the draws read from a body: passes the keyword length rule, keyword found, number"""
+    found = re.search(r'(\d+)', body)
+    return (len(body) < config.comment_character_limit, re.search('fake', body, re.IGNORECASE) is not None
+            if len(body) < config.comment_character_limit else None, int(found.group(0)) if found else None)
+
+
+def run():
+    fake = FakeReddit(seed=1)
+    post = fake.make_post('benchmark', '[123456] Records check')
+    failed = 0
+    for index, body in enumerate(bodies()):
+        comment = FakeComment(fake, 'c%s' % index, FakeRedditor(fake, 'user%s' % index), body, post, index)
+        record = reddit._record(comment)
+        expected = answers(body)
+        got = answers(record.body)[:2] + (record.number,)
+        if got != expected:
+            failed += 1
+            print('MISMATCH length %s: full comment %s, record %s' % (len(body), expected, got))
+    print('%s bodies checked, %s mismatches' % (index + 1, failed))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    logging.disable(logging.CRITICAL)
+    sys.exit(run())
@@ -0,0 +1,227 @@
+""" Hot path benchmarks: replays synthetic workloads through parsing, comment harvesting, draws, number updates and
+    code distribution against benchmarks.fakereddit, and compares them with the stored baseline.
+    Each case records its best wall time, the peak memory it allocated (tracemalloc) and the API requests it made.
+    Usage: python -m benchmarks.suite [--sizes 1000 10000 100000] [--cases NAME ...] [--repeat N]
+                                      [--tolerance T] [--strict-time] [--baseline PATH] [--save]
+    Exits with 1 when a case allocates more memory than the baseline by more than tolerance or makes more API calls.
+    Wall times of a few milliseconds are too noisy to gate on, they are only compared with --strict-time."""
+import argparse
+import datetime
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+
+from benchmarks import fakereddit
+
+fakereddit.offline_config()  # before utils sets up the scheduler, outbox and budget
+
+import outbox  # noqa: E402
+import reddit  # noqa: E402
+import utils  # noqa: E402
+from benchmarks.fakereddit import FakePastebin, FakeReddit, api_calls  # noqa: E402
+from benchmarks.parse_pm import corpus  # noqa: E402
+from spec import GiveawayArgs  # noqa: E402
+
+default_baseline = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+codes_corpus = [
+    'GAME-CODE-1 GAME-CODE-2 GAME-CODE-3',
+    'GAME-CODE-1 GAME-CODE-2 [GAME-CODE-3E GAME-3-DLCE]',
+    '"xbox one" "battlefield 1"',
+    'ABCDE-FGHIJ-KLMNO [PQRST-UVWXY Z0123-45678] 9ABCD-EFGHI',
+    'not_a_valid_code!',
+]
+requester = 'benchmark'
+identifier = '123456'
+
+
+class Backend(object):
+    """ Fresh fake reddit and pastebin installed for one run of a case."""
+
+    def __init__(self):
+        self.reddit = FakeReddit(seed=1)
+        self.pastebin = FakePastebin()
+        reddit.use_client(self.reddit)
+        utils.use_pastebin(self.pastebin)
+        # nothing carried over from the previous run: stored comments, numbers and cached profiles
+        reddit.comment_store.clear()
+        utils.used_numbers.clear()
+        reddit._profile_cache = None
+
+    def calls(self):
+        return api_calls(self.reddit) + sum(self.pastebin.calls.values())
+
+
+def giveaway_args(giveaway_type, winners=3, pkarma=0):
+    return GiveawayArgs(giveaway_type, datetime.datetime.utcnow(), guessnum=5000, minnum=0, maxnum=10000,
+                        keyword='benchmark', winners=winners, pkarma=pkarma)
+
+
+def post_of(backend, giveaway_type, size):
+    return backend.reddit.make_post(requester, '[%s] Benchmark giveaway' % identifier, size, giveaway_type,
+                                    keyword='benchmark')
+
+
+# each case takes the workload size and returns the function to measure, set up with a fresh backend
+def case_parse_pm(backend, size):
+    messages = [corpus[x % len(corpus)] for x in range(size)]
+
+    def run():
+        for message in messages:
+            try:
+                utils.parse_pm(message, requester, identifier)
+            except utils.ParseError:
+                pass
+    return run
+
+
+def case_parse_codes(backend, size):
+    inputs = [codes_corpus[x % len(codes_corpus)] for x in range(size)]
+    return lambda: [utils.parse_codes(x, identifier, requester) for x in inputs]
+
+
+def case_unique_users(backend, size):
+    post = post_of(backend, 'random', size)
+    return lambda: reddit.unique_users(requester, identifier, post.id)
+
+
+def case_random_winner(backend, size):
+    post = post_of(backend, 'random', size)
+    args = giveaway_args('random', pkarma=100)
+    return lambda: utils.random_winner(requester, identifier, args, post)
+
+
+def case_pick_winner_number(backend, size):
+    post = post_of(backend, 'number', size)
+    args = giveaway_args('number', pkarma=100)
+    return lambda: utils.pick_winner(requester, identifier, args, post)
+
+
+def case_pick_winner_keyword(backend, size):
+    post = post_of(backend, 'keyword', size)
+    args = giveaway_args('keyword', pkarma=100)
+    return lambda: utils.pick_winner(requester, identifier, args, post)
+
+
+def case_update_numbers(backend, size):
+    post = post_of(backend, 'number', size)
+    bot_comment = post.reply('Giveaway set up.')
+    args = giveaway_args('number')
+    return lambda: utils.update_numbers(requester, identifier, args, post, bot_comment)
+
+
+def case_giveaway_codes(backend, size):
+    # one winner per hundred comments, each gets a PM through the outbox
+    post = post_of(backend, 'random', 0)
+    winners = ['user%s' % x for x in range(max(size // 100, 2))]
+
+    def run():
+        utils.giveaway_codes(requester, identifier, winners, ['CODE-%s' % x for x in range(len(winners))], post)
+        outbox.drain()
+    return run
+
+
+cases = [
+    ('parse_pm', case_parse_pm),
+    ('parse_codes', case_parse_codes),
+    ('unique_users', case_unique_users),
+    ('random_winner', case_random_winner),
+    ('pick_winner_number', case_pick_winner_number),
+    ('pick_winner_keyword', case_pick_winner_keyword),
+    ('update_numbers', case_update_numbers),
+    ('giveaway_codes', case_giveaway_codes),
+]
+
+
+def measure(make, size, repeat):
+    """ Returns: [dict] of best wall time, peak allocated memory and API calls of a case at size"""
+    best = None
+    for _ in range(repeat):
+        backend = Backend()
+        run = make(backend, size)
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+        calls = backend.calls()
+    # tracemalloc slows everything down, memory is measured in a separate run
+    backend = Backend()
+    run = make(backend, size)
+    tracemalloc.start()
+    try:
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {'seconds': round(best, 4), 'peak_kib': round(peak / 1024.0, 1), 'api_calls': calls}
+
+
+def regressions(result, baseline, tolerance, strict_time=False):
+    """ Returns: [list] of [string] descriptions of what got worse than baseline, wall time only if strict_time"""
+    found = []
+    for key in ('seconds', 'peak_kib') if strict_time else ('peak_kib',):
+        if baseline.get(key) and result[key] > baseline[key] * (1 + tolerance):
+            found.append('%s %s -> %s' % (key, baseline[key], result[key]))
+    if 'api_calls' in baseline and result['api_calls'] > baseline['api_calls']:
+        found.append('api_calls %s -> %s' % (baseline['api_calls'], result['api_calls']))
+    return found
+
+
+def positive(value):
+    """ argparse type of --repeat, at least one run is needed to have a time"""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError('%s is not a positive number' % value)
+    return number
+
+
+def run(sizes, names, repeat, tolerance, baseline_path, save, strict_time=False):
+    baseline = {}
+    if os.path.exists(baseline_path):
+        with open(baseline_path) as baseline_file:
+            baseline = json.load(baseline_file)
+    results = {}
+    failed = []
+    print('%-22s %8s %10s %10s %12s %9s' % ('case', 'size', 'seconds', 'vs base', 'peak KiB', 'API calls'))
+    for name, make in cases:
+        if names and name not in names:
+            continue
+        for size in sizes:
+            key = '%s@%s' % (name, size)
+            result = results[key] = measure(make, size, repeat)
+            previous = baseline.get(key)
+            change = ''
+            if previous and previous.get('seconds'):
+                change = '%+.0f%%' % ((result['seconds'] / previous['seconds'] - 1) * 100)
+            worse = regressions(result, previous, tolerance, strict_time) if previous else []
+            print('%-22s %8s %10.4f %10s %12.1f %9s%s' % (name, size, result['seconds'], change, result['peak_kib'],
+                                                          result['api_calls'],
+                                                          '  REGRESSION: %s' % ', '.join(worse) if worse else ''))
+            if worse:
+                failed.append(key)
+    if save:
+        baseline.update(results)
+        with open(baseline_path, 'w') as baseline_file:
+            json.dump(baseline, baseline_file, indent=2, sort_keys=True)
+        print('Baseline saved to %s' % baseline_path)
+    elif failed:
+        print('%s regressions against %s' % (len(failed), baseline_path))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Hot path benchmarks against an in-memory reddit.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000], help='comments per post')
+    parser.add_argument('--cases', nargs='+', choices=[x[0] for x in cases], help='cases to run, all by default')
+    parser.add_argument('--repeat', type=positive, default=3, help='runs per case, the fastest counts')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed growth over the baseline')
+    parser.add_argument('--strict-time', action='store_true', help='also fail on wall times over the tolerance')
+    parser.add_argument('--baseline', default=default_baseline)
+    parser.add_argument('--save', action='store_true', help='store the results as the new baseline')
+    options = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+    sys.exit(run(options.sizes, options.cases, options.repeat, options.tolerance, options.baseline, options.save,
+                 options.strict_time))
@@ -23,16 +23,50 @@ logger.addHandler(handler)
 #  Set logging level for libraries:
 logging.getLogger("apscheduler").setLevel(logging.WARNING)
 
-# giveaway_args = [type, date, guessnum, minnum, maxnum, keyword, winners, is_mention, pkarma, ckarma, days]
+database = 'giveaways.sqlite'  # scheduler jobs and outbound PMs
+database_timeout = 30  # (in seconds) wait for another worker process to finish writing to the database
+shards = 1  # worker processes, giveaway draws and number updates are split between them by identifier
+claim_interval = 10  # (in seconds) Interval for shard workers to start the giveaways handed to them
+startup_profile = False  # log import, scheduler start and first inbox check times on startup
+runtime = 'threads'  # 'threads' or 'asyncio' (needs requirements-asyncio.txt), how scheduler jobs are run
+async_thread_workers = 10  # (asyncio runtime) threads running the jobs that still use blocking praw
+inbox_workers = 4  # threads for inbox polling and post checks, kept apart from the heavy jobs
+heavy_workers = 4  # threads for giveaway draws and number updates
+default_workers = 4  # threads for the other jobs (outbox, logs, retries)
+pool_wait_warning = 30  # (in seconds) log jobs that waited longer than this for a free thread
+pool_wait_samples = 100  # number of latest jobs the average / max wait of a pool is computed from
+pool_stats_interval = 15  # (in minutes) Interval to log queue depth and wait times of the job pools
+misfire_grace_time = 3600  # (in seconds) how late a queued job may still start
+api_requests_per_minute = 90  # reddit API calls per minute, split between shards, reddit allows 100
+api_burst = 20  # API calls that can be made back to back after an idle period
+api_low_priority_reserve = 5  # API calls number updates leave to draws and PMs
+
 check_logs = 1  # (in minutes) Interval to check and upload logs to pastebin
-check_pm_interval = 1  # (in minutes) Interval to check for new PMs
-check_mentions_interval = 1  # (in minutes) Interval to check for new mentions
+check_inbox_interval = 1  # (in minutes) Interval to check for new PMs and mentions
+inbox_limit = 50  # number of unread inbox items handled per check
 check_post_interval = 1  # (in minutes) Interval to check for giveaway post
 check_post_timeout = 15  # (in minutes) Timeout to check for giveaway post
+ids_sweep_interval = 60  # (in minutes) Interval to release the identifiers of finished pre-upgrade jobs
+scheduling_timeout = 10  # (in minutes) giveaways found but still not scheduled after this are reset or ended
 submissions_limit = 5  # number of *new* submissions that will be checked for the unique identifier
 comment_character_limit = 300  # comments longer than this char limit will be skipped (keyword giveaway)
+comment_body_prefix = 300  # characters kept of harvested comments, at least comment_character_limit
 update_numbers_interval = 1  # (in minutes) Interval to update numbers that have been posted in a number giveaway
 update_numbers_comment_limit = 2000  # if number of comments gets past this, bot will stop updating numbers
+update_numbers_republish = 50  # (in minutes) unchanged numbers are pasted again before the 1 hour paste expires
+update_numbers_compact = True  # paste ranges of numbers (1-250, 300) instead of every single number
+update_numbers_free_ratio = 0.5  # paste the free numbers instead once more than this share of the range is used
+account_check_workers = 8  # number of redditor accounts checked at the same time when picking winners
+profile_cache_size = 10000  # number of redditor profiles (karma, account age) kept in memory
+profile_cache_ttl = 360  # (in minutes) time before a cached redditor profile is fetched again
+profile_cache_db = 'profiles.sqlite'  # keeps cached profiles between restarts, None for memory only
+date_cache_size = 1024  # number of parsed 'when to run' phrases kept
+trace_spans = True  # record how long each giveaway stage takes in the spans table (see tracing.py)
+trace_flush_size = 100  # number of spans kept in memory before they are written to the database
+trace_flush_interval = 30  # (in seconds) longest time spans are kept in memory
+trace_retention = 14  # (in days) time spans are kept
+metrics_host = '127.0.0.1'  # address the /metrics endpoint listens on
+metrics_port = 9120  # port of the /metrics endpoint (shard workers use the next ones), None to disable
 reply_subject = "AutoGiveaway Bot"
 footer_message = '  \n  \n-------------------------------------' \
                  '  \n AutoGiveaway Bot - [Wiki](https://www.reddit.com/r/autogiveaway/wiki/index)' \
@@ -40,16 +74,25 @@ footer_message = '  \n  \n-------------------------------------' \
 
 # ---------------- error / retry in case of connection/API errors
 retries = 5  # Number of times script will retry
-backoff_multiplier = 1
+backoff_multiplier = 2
 wait_time = 5  # (in seconds) wait time between retries (*backoff_multiplier per additional try)
+wait_jitter = 2  # (in seconds) random extra wait added to each retry so retries don't fire all at once
+max_wait_time = 60  # (in seconds) longest wait a worker thread will sleep for a retry, longer waits give up
 retry_failed_pms_retries = 6  # number of times retry_failed_pms will run
 retry_failed_pms_wait_time = 15  # (in minutes) wait time between retry_failed_pms executions
+pm_workers = 4  # number of PMs sent at the same time
+pm_per_minute = 30  # maximum number of PMs sent per minute
+outbox_interval = 1  # (in minutes) Interval to send queued and failed PMs
+outbox_lease = 30  # (in minutes) PMs still being sent after this were lost by a stopped bot and are sent again
+outbox_retention = 7  # (in days) sent and failed PMs are kept in the outbox, without their message
 
 # ---------------- giveaway.process_pm errors
 parse_errormessage = '**Giveaway not started:**' \
                      '  \n Something went wrong while parsing your message,' \
                      ' please double check the formatting and try again.'
 
+parse_error_detail = '  \n Problem found: {0}'
+
 parse_mention_errormessage = 'This doesn\'t look like anything to me...'
 
 codes_errormessage = '**Giveaway not started:**' \
@@ -0,0 +1,68 @@
+import contextlib
+import sqlite3
+import threading
+
+import config
+
+# shared connection to config.database, used by the modules keeping their own tables next to the scheduler jobs
+_db = None
+_lock = threading.RLock()
+_ready = set()
+
+
+@contextlib.contextmanager
+def transaction(immediate=False):
+    """ Yields the database connection, holding the lock and committing when done.
+        immediate takes the database write lock right away, for reads that decide what to write when other worker
+        processes share the database (see config.shards)."""
+    global _db
+    with _lock:
+        if _db is None:
+            _db = sqlite3.connect(config.database, timeout=config.database_timeout, check_same_thread=False)
+        try:
+            if immediate:
+                _db.execute('BEGIN IMMEDIATE')
+            yield _db
+            _db.commit()
+        except Exception:
+            _db.rollback()
+            raise
+
+
+def setup(name, statements):
+    """ Runs the statements creating a table the first time name is set up in this process."""
+    if name in _ready:  # set up already, no need to wait for the lock
+        return
+    with transaction() as db:
+        if name not in _ready:
+            for statement in statements:
+                db.execute(statement)
+            _ready.add(name)
+
+
+def execute(query, args=()):
+    """ Returns: [list] of rows"""
+    with transaction() as db:
+        return db.execute(query, args).fetchall()
+
+
+def executemany(query, rows):
+    with transaction() as db:
+        db.executemany(query, rows)
+
+
+def add_columns(table, columns):
+    """ Adds the columns missing from a table created by an older version.
+        Parameters:
+            table:      [string] table name
+            columns:    [list] of column definitions, e.g. 'status TEXT'
+        Only the first call for a table in this process looks at the table, like setup()."""
+    name = table + ' columns'
+    if name in _ready:
+        return
+    with transaction() as db:
+        existing = set(row[1] for row in db.execute('PRAGMA table_info(%s)' % table))
+        for column in columns:
+            if column.split()[0] not in existing:
+                db.execute('ALTER TABLE %s ADD COLUMN %s' % (table, column))
+        _ready.add(name)
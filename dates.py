@@ -0,0 +1,84 @@
+import datetime
+import functools
+import re
+
+import config
+
+# fast path for the date formats from the README, dateparser is only imported and used for anything else
+_months = dict((name, number) for number, names in enumerate([
+    ('january', 'jan'), ('february', 'feb'), ('march', 'mar'), ('april', 'apr'), ('may',), ('june', 'jun'),
+    ('july', 'jul'), ('august', 'aug'), ('september', 'sept', 'sep'), ('october', 'oct'), ('november', 'nov'),
+    ('december', 'dec')], 1) for name in names)
+_units = {'minute': 'minutes', 'min': 'minutes', 'hour': 'hours', 'hr': 'hours', 'day': 'days', 'week': 'weeks'}
+# fixed UTC offsets in hours, as dateparser reads them
+_timezones = {'utc': 0, 'gmt': 0, 'z': 0, 'est': -5, 'edt': -4, 'cst': -6, 'cdt': -5, 'mst': -7, 'mdt': -6,
+              'pst': -8, 'pdt': -7, 'akst': -9, 'akdt': -8, 'hst': -10, 'bst': 1, 'cet': 1, 'cest': 2, 'eet': 2,
+              'eest': 3, 'ist': 5.5, 'jst': 9, 'aest': 10, 'aedt': 11}
+
+_relative_pattern = re.compile(r'in (an?|[0-9]+) (%s)s?$' % '|'.join(_units))
+_month = '(%s)\\.?' % '|'.join(sorted(_months, key=len, reverse=True))
+_weekday = '(?:(?:mon|tues|wednes|thurs|fri|satur|sun)day,? )?'
+_time = '(?:,? (?:at )?([0-9]{1,2})(?::([0-9]{2}))? ?(am|pm)?)?(?: ([a-z]{1,4}))?$'
+_day_month_pattern = re.compile(_weekday + '([0-9]{1,2})(?:st|nd|rd|th)? (?:of )?' + _month + ',? ([0-9]{4})' + _time)
+_month_day_pattern = re.compile(_weekday + _month + ' ([0-9]{1,2})(?:st|nd|rd|th)?,? ([0-9]{4})' + _time)
+_date_settings = {'TIMEZONE': 'UTC', 'TO_TIMEZONE': 'UTC', 'STRICT_PARSING': True, 'DATE_ORDER': 'MDY'}
+
+
+def now():
+    """ Returns: [datetime] current time, naive UTC like the dates returned by parse()"""
+    return datetime.datetime.utcnow()
+
+
+def _absolute(year, month, day, hour, minute, meridiem, timezone):
+    hour = int(hour or 0)
+    minute = int(minute or 0)
+    if meridiem:
+        if not 1 <= hour <= 12:
+            return None
+        hour = hour % 12 + (12 if meridiem == 'pm' else 0)
+    if timezone is not None and timezone not in _timezones:
+        return None
+    try:
+        date = datetime.datetime(int(year), _months[month], int(day), hour, minute)
+    except ValueError:  # e.g. 30 february
+        return None
+    return date - datetime.timedelta(hours=_timezones.get(timezone, 0))
+
+
+@functools.lru_cache(maxsize=config.date_cache_size)
+def _resolve(phrase):
+    """ Returns: [timedelta] from now for relative phrases, [datetime] for absolute ones,
+                 None if the phrase is not one of the fast path formats"""
+    found = _relative_pattern.match(phrase)
+    if found:
+        amount = 1 if found.group(1) in ('a', 'an') else int(found.group(1))
+        return datetime.timedelta(**{_units[found.group(2)]: amount})
+    found = _day_month_pattern.match(phrase)
+    if found:
+        day, month, year, hour, minute, meridiem, timezone = found.groups()
+        return _absolute(year, month, day, hour, minute, meridiem, timezone)
+    found = _month_day_pattern.match(phrase)
+    if found:
+        month, day, year, hour, minute, meridiem, timezone = found.groups()
+        return _absolute(year, month, day, hour, minute, meridiem, timezone)
+    return None
+
+
+def _fallback(text):
+    import dateparser  # slow to import, only loaded for dates the fast path does not know
+    date = dateparser.parse(text, settings=_date_settings)
+    if date and date.tzinfo:  # dates given with a timezone
+        date = date.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return date
+
+
+def parse(text):
+    """ Parses when to run a giveaway, e.g. "in 24 hours", "15 february 2017", "friday 24 february 2017 5:00 pm EST".
+        Returns: [datetime] naive UTC, None if the text is not a date"""
+    phrase = ' '.join(text.lower().split())
+    resolved = _resolve(phrase)
+    if isinstance(resolved, datetime.timedelta):
+        return now() + resolved
+    if resolved is not None:
+        return resolved
+    return _fallback(text)
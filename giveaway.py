@@ -1,8 +1,18 @@
+import asyncio
 import logging
+import time
 import utils
 import config
+import ids
 import reddit
-import datetime
+import aioreddit
+import pools
+import ratelimit
+import retry
+import shards
+import store
+import tracing
+from spec import GiveawayArgs
 
 
 def process_pm(pm):
@@ -15,29 +25,34 @@ def process_pm(pm):
     message_id = str(pm.id)  # ID of the PM
 
     logging.info("%s:%s: Processing PM...", message_id, requester)
-    giveaway_args = utils.parse_pm(content, requester, message_id)  # parse giveaway settings
-    if giveaway_args is None:
-        reddit.send_pm(requester, config.reply_subject, config.parse_errormessage, message_id, requester)
-        logging.warning("%s:%s: Failed to parse pm, check formatting. Ending <process_pm> process.", message_id, requester)
+    try:
+        with tracing.span(message_id, tracing.PARSE):
+            giveaway_args = utils.parse_pm(content, requester, message_id)  # parse giveaway settings
+    except utils.ParseError as error:
+        reddit.send_pm(requester, config.reply_subject,
+                       config.parse_errormessage + config.parse_error_detail.format(error), message_id, requester,
+                       defer=True)
+        logging.warning("%s:%s: Failed to parse pm: %s. Ending <process_pm> process.", message_id, requester, error)
         return
-    codes_tmp = giveaway_args[11]
-    codes = utils.parse_codes(codes_tmp[0], message_id, requester)  # parse codes
+    codes = utils.parse_codes(giveaway_args.codes, message_id, requester)  # parse codes
     if codes is None:
-        reddit.send_pm(requester, config.reply_subject, config.codes_errormessage, message_id, requester)
+        reddit.send_pm(requester, config.reply_subject, config.codes_errormessage, message_id, requester,
+                       defer=True)
         logging.warning("%s:%s: Failed to parse codes, check formatting. Ending <process_pm> process.", message_id,
                     requester)
         return
-    giveaway_args.remove(giveaway_args[11])  # remove codes from giveaway_args
+    giveaway_args.codes = None  # parsed codes are kept apart from giveaway_args
     # check to make sure we have enough codes for all winners
-    num_winners = giveaway_args[6]
+    num_winners = giveaway_args.winners
     num_codes = len(codes)
     if num_codes < num_winners:
         reddit.send_pm(requester, config.reply_subject, config.winners_errormessage
-                           .format(num_winners, num_codes), message_id, requester)
+                           .format(num_winners, num_codes), message_id, requester, defer=True)
         logging.warning("%s:%s: More winners than codes to give away: winners: %s, codes: %s. Ending <process_pm> process.",
                     message_id, requester, num_winners, num_codes)
         return
-    identifier = str(utils.gen_code())
+    identifier = ids.allocate(requester)
+    tracing.rekey(message_id, identifier)
     setup(requester, identifier, giveaway_args, codes)
     logging.info("%s:%s: Processed OK, identifier assigned: %s", message_id, requester, identifier)
 
@@ -73,20 +88,21 @@ def process_mention(mention):
     if requester == post_author:
         logging.info("%s:%s: Requester matches giveaway OP, processing request.", parent_id, requester)
 
-        giveaway_args = utils.parse_pm(content, requester, parent_id)
-        if giveaway_args is None:
-            error = "  \n Double check the formatting and try again."
+        try:
+            with tracing.span(parent_id, tracing.PARSE):
+                giveaway_args = utils.parse_pm(content, requester, parent_id)
+        except utils.ParseError as reason:
+            error = config.parse_error_detail.format(reason) + "  \n Double check the formatting and try again."
             reddit.post_comment(comment, config.parse_mention_errormessage + error, parent_id, requester)
-            logging.warning("%s:%s: Failed to parse arguments, check formatting. Ending <process_mention> process.",
-                        parent_id, requester)
+            logging.warning("%s:%s: Failed to parse arguments: %s. Ending <process_mention> process.",
+                        parent_id, requester, reason)
             return
 
         # args OK, launch giveaway
-        identifier = str(utils.gen_code())
-        job_id_mention = '%s:%s:PROCESS_MENTION' % (identifier, requester)
-        codes = None
-        utils.scheduler.add_job(process, id=job_id_mention,
-                                args=[requester, identifier, giveaway_args, codes, post, comment])
+        identifier = ids.allocate(requester)
+        tracing.rekey(parent_id, identifier)
+        store.save(identifier, requester, giveaway_args, None, post.id, comment.id)
+        hand_off(identifier)
         logging.info("%s:%s: Completed, OK", parent_id, requester)
     else:
         error = "  \n Only the OP can run a giveaway in this post.  \n ^Your ^username ^does ^not ^match ^OP."
@@ -96,31 +112,24 @@ def process_mention(mention):
 
 
 def setup(requester, identifier, giveaway_args, codes):
-    """ Initializes giveaway by asking requester to identify giveaway post with 6 digit code, adds
-        check_post job to apscheduler and end_job.
+    """ Initializes giveaway by asking requester to identify giveaway post with 6 digit code, the DISCOVER_POSTS job
+        then looks for the post until config.check_post_timeout.
         Parameters:
             requester:      [string] reddit username
             identifier:     [string] unique 6 digit
-            giveaway_args:  [list] parsed giveaway arguments
+            giveaway_args:  [object] GiveawayArgs of parsed giveaway arguments
             codes:          [list] parsed giveaway codes"""
     logging.info("%s:%s: Initiating setup...", identifier, requester)
     # send message asking to setup giveaway post
-    sent = reddit.send_pm(requester, config.reply_subject, config.setup_message
+    with tracing.span(identifier, tracing.SETUP_PM):
+        sent = reddit.send_pm(requester, config.reply_subject, config.setup_message
                               .format(str(config.check_post_timeout), identifier), identifier, requester)
     # if PM was not sent successfully, don't bother setting anything up
     if not sent:
         logging.error("%s:%s: Was unable to send PM with setup information. Ending <setup> process.", identifier, requester)
+        ids.release(identifier)
         return
-    # add job to check for post
-    job_id_checkpost = '%s:%s:CHECK_POST' % (identifier, requester)
-    utils.scheduler.add_job(reddit.check_post, 'interval', minutes=config.check_post_interval, id=job_id_checkpost,
-                            args=[requester, identifier, giveaway_args, codes])
-    # get timedelta for when to stop
-    request_timeout = datetime.datetime.now() + datetime.timedelta(minutes=config.check_post_timeout)
-    # end job of checking for post if timeout is reached
-    job_id_endjob = '%s:%s:END_JOB' % (identifier, requester)
-    utils.scheduler.add_job(utils.end_job, 'date', run_date=request_timeout, id=job_id_endjob,
-                            args=[job_id_checkpost, "Giveaway post not found within the time limit."])
+    store.save(identifier, requester, giveaway_args, codes)
     logging.info("%s:%s: Completed, OK", identifier, requester)
 
 
@@ -129,30 +138,34 @@ def schedule(requester, identifier, giveaway_args, codes, post):
         Parameters:
             requester:      [string] reddit username
             identifier:     [string] unique 6 digit
-            giveaway_args:  [list] parsed giveaway arguments
+            giveaway_args:  [object] GiveawayArgs of parsed giveaway arguments
             codes:          [list] parsed giveaway codes
             post:           [object] from praw"""
     logging.info("%s:%s: Scheduling...", identifier, requester)
-    giveaway_type = giveaway_args[0]
-    date = giveaway_args[1]
+    giveaway_args = GiveawayArgs.from_list(giveaway_args)
+    giveaway_type = giveaway_args.giveaway_type
+    date = giveaway_args.date
     string_date = date.strftime("%d-%b-%Y %H:%M")
-    num_winners = giveaway_args[6]
-    pkarma = giveaway_args[8]
-    ckarma = giveaway_args[9]
-    days = giveaway_args[10]
+    num_winners = giveaway_args.winners
+    pkarma = giveaway_args.pkarma
+    ckarma = giveaway_args.ckarma
+    days = giveaway_args.days
     numbers_comment = None
+    comments = tracing.span(identifier, tracing.SCHEDULE_COMMENT)
     if giveaway_type == 'random':
         comment = reddit.post_comment(post, config.giveaway_comment_random
                                           .format(requester, string_date, pkarma, ckarma, days, num_winners),
                                           identifier, requester)
     else:
         if giveaway_type == 'number':
-            min_number = giveaway_args[3]
-            max_number = giveaway_args[4]
+            min_number = giveaway_args.minnum
+            max_number = giveaway_args.maxnum
             comment = reddit.post_comment(post, config.giveaway_comment_number
                                               .format(requester, min_number, max_number,
                                                       string_date, pkarma, ckarma, days, num_winners),
                                               identifier, requester)
+            if comment:  # a failure from here on must not post the giveaway comment again, see _unschedule()
+                store.update(identifier, comment_id=comment.id)
             # comment to track numbers used
             numbers_comment = reddit.post_comment(comment, 'Numbers already posted will be added here.'
                                                                '  \n ^This ^comment ^updates ^every ^{0} ^minutes.'
@@ -163,58 +176,61 @@ def schedule(requester, identifier, giveaway_args, codes, post):
                                                   .format(requester, string_date, pkarma, ckarma, days, num_winners),
                                                   identifier, requester)
             else:
+                comments.stop(failed=True)
+                finish(identifier)
                 sent = reddit.send_pm(requester, config.reply_subject,
-                                          config.giveaway_comment_failed.format(identifier), identifier, requester)
+                                          config.giveaway_comment_failed.format(identifier), identifier, requester,
+                                          defer=True)
                 if not sent:
                     logging.error("%s:%s: No giveaway type detected, failed to send PM. Ending <schedule> process.",
                               identifier, requester)
                     return
                 else:
-                    logging.error("%s:%s: No giveaway type detected, PM sent. Ending <schedule> process.",
-                              identifier, requester)
+                    logging.error("%s:%s: No giveaway type detected, %s. Ending <schedule> process.",
+                              identifier, requester, _pm_result(sent))
                     return
 
+    comments.stop(failed=not comment)
     if comment:
-        # schedule job to process giveaway
-        job_id = '%s:%s:PROCESS' % (identifier, requester)
-        utils.scheduler.add_job(process, 'date', run_date=date, id=job_id,
-                                args=[requester, identifier, giveaway_args, codes, post, comment])
-
-        # if giveaway is of number type, create job to track numbers used
-        if numbers_comment:
-            job_id = '%s:%s:UPDATE_NUMBERS' % (identifier, requester)
-            utils.scheduler.add_job(utils.update_numbers, 'interval', minutes=config.update_numbers_interval, id=job_id,
-                                    args=[requester, identifier, giveaway_args, post, numbers_comment])
-
+        store.update(identifier, post_id=post.id, comment_id=comment.id,
+                     numbers_comment_id=numbers_comment.id if numbers_comment else None, status='ready')
+        hand_off(identifier)
         logging.info("%s:%s: Completed, OK", identifier, requester)
     else:
+        finish(identifier)
         # failed to create comment
         # send PM informing that giveaway was not scheduled
         sent = reddit.send_pm(requester, config.reply_subject, config.giveaway_scheduling_failed
-                                  .format(identifier), identifier, requester)
+                                  .format(identifier), identifier, requester, defer=True)
         if not sent:
             logging.error("%s:%s: Failed to post giveaway comment, failed to send PM. Ending <schedule> process.",
                       identifier, requester)
             return
         else:
-            logging.error("%s:%s: Failed to post giveaway comment, PM was sent. Ending <schedule> process.",
-                      identifier, requester)
+            logging.error("%s:%s: Failed to post giveaway comment, %s. Ending <schedule> process.",
+                      identifier, requester, _pm_result(sent))
             return
 
 
+def _pm_result(sent):
+    """ Returns: [string] how a PM sent with defer went, for the logs"""
+    return 'PM scheduled for retry' if sent is retry.DEFERRED else 'PM was sent'
+
+
 def process(requester, identifier, giveaway_args, codes, post, comment):
     """ Processes the giveaway, gets winners, edits giveaway comment, notifies requester of end or errors.
         Parameters:
             requester:      [string] reddit username
             identifier:     [string] unique 6 digit
-            giveaway_args:  [list] parsed giveaway arguments
+            giveaway_args:  [object] GiveawayArgs of parsed giveaway arguments
             codes:          [list] parsed giveaway codes
             post:           [object] from praw
             comment:        [object] from praw"""
 
     logging.info("%s:%s: Running giveaway...", identifier, requester)
-    giveaway_type = giveaway_args[0]
-    is_mention = giveaway_args[7]
+    giveaway_args = GiveawayArgs.from_list(giveaway_args)  # jobs scheduled by older versions pass a list
+    giveaway_type = giveaway_args.giveaway_type
+    is_mention = giveaway_args.is_mention
     winner_comment = None
     error_codes = False
     pm_message = None
@@ -222,66 +238,68 @@ def process(requester, identifier, giveaway_args, codes, post, comment):
     log_msg1 = None
     log_msg2 = None
 
-    if giveaway_type == 'random':
-        winner = utils.random_winner(requester, identifier, giveaway_args, post)
-    else:
-        winner, winner_comment = utils.pick_winner(requester, identifier, giveaway_args, post)
+    with tracing.span(identifier, tracing.DRAW):
+        if giveaway_type == 'random':
+            winner = utils.random_winner(requester, identifier, giveaway_args, post)
+        else:
+            winner, winner_comment = utils.pick_winner(requester, identifier, giveaway_args, post)
+    # winners are picked, end the number updates first so that none rebuilds the used numbers dropped below
+    if giveaway_type == 'number' and not is_mention:
+        job_id = '%s:%s:UPDATE_NUMBERS' % (identifier, requester)
+        utils.end_job(job_id, "Giveaway ended for Identifier: {0} : end_job:update_numbers".format(identifier))
+    # stored comments and used numbers for the post are no longer needed
+    reddit.forget_post(post.id)
+    utils.used_numbers.pop(identifier, None)
     # Handle errors if they happen or dish out the codes
     if winner is -1:  # 0 comments on post
         pm_message = config.giveaway_error_nocomments
         post_comment = config.giveaway_comment_nowinnercomments
         log_msg1 = "%s:%s: No comments found in post, failed to send PM."
-        log_msg2 = "%s:%s: No comments found in post, PM was sent."
+        log_msg2 = "%s:%s: No comments found in post, %s."
         error_codes = True
 
     if winner is -2:  # not enough winners vs codes were found
         pm_message = config.giveaway_error_enoughwinners
         post_comment = config.giveaway_comment_enoughwinner
         log_msg1 = "%s:%s: Not enough winners found, failed to send PM. Ending <process> process."
-        log_msg2 = "%s:%s: Not enough winners found, PM was sent. Ending <process> process."
+        log_msg2 = "%s:%s: Not enough winners found, %s. Ending <process> process."
         error_codes = True
 
     if winner is -3:  # api problems
         pm_message = config.giveaway_error_api
         log_msg1 = "%s:%s: There was an API/Reddit error, failed to send PM. Ending <process> process."
-        log_msg2 = "%s:%s: There was an API/Reddit error, PM was sent. Ending <process> process."
+        log_msg2 = "%s:%s: There was an API/Reddit error, %s. Ending <process> process."
         error_codes = True
 
     if winner is -4:  # not enough winners with valid accounts
         pm_message = config.giveaway_error_winners_accounts
         post_comment = config.giveaway_comment_winners_accounts.format(
-            giveaway_args[8], giveaway_args[9], giveaway_args[10])
+            giveaway_args.pkarma, giveaway_args.ckarma, giveaway_args.days)
         log_msg1 = "%s:%s: Not enough winners with valid accounts found, failed to send PM. Ending <process> process."
-        log_msg2 = "%s:%s: Not enough winners with valid accounts found, PM was sent. Ending <process> process."
+        log_msg2 = "%s:%s: Not enough winners with valid accounts found, %s. Ending <process> process."
         error_codes = True
 
     if error_codes:
         sent = reddit.send_pm(requester, config.reply_subject, pm_message.
-                                  format(post.title, post.permalink), identifier, requester)
+                                  format(post.title, post.permalink), identifier, requester, defer=True)
         if not is_mention:
             if post_comment:
                 reddit.edit_comment(comment, post_comment, identifier, requester)
 
-            if giveaway_type == 'number':
-                job_id = '%s:%s:UPDATE_NUMBERS' % (identifier, requester)
-                utils.end_job(job_id, "Giveaway ended for Identifier: {0} : end_job:update_numbers".format(identifier))
-
         if not sent:
             logging.error(log_msg1, identifier, requester)
             return
         else:
-            logging.error(log_msg2, identifier, requester)
+            logging.error(log_msg2, identifier, requester, _pm_result(sent))
             return
     else:
         str_winner = ''
         if not is_mention:
             # distribute codes and send PMs
-            str_winner = utils.giveaway_codes(requester, identifier, winner, codes, post)
-        # end update numbers job
-        if giveaway_type == 'number':
-            job_id = '%s:%s:UPDATE_NUMBERS' % (identifier, requester)
-            utils.end_job(job_id, "Giveaway ended for Identifier: {0} : end_job:update_numbers".format(identifier))
+            with tracing.span(identifier, tracing.PM_FANOUT):
+                str_winner = utils.giveaway_codes(requester, identifier, winner, codes, post)
         # edit giveaway comment
+        edit = tracing.span(identifier, tracing.COMMENT_EDIT)
         if winner_comment:
             str_winner_numbers = ''
             for redditor in winner:
@@ -311,7 +329,202 @@ def process(requester, identifier, giveaway_args, codes, post, comment):
                 comment_return = reddit.edit_comment(comment, config.giveaway_comment_end.format(str_winner),
                                                          identifier, requester)
 
+        edit.stop(failed=not comment_return)
         # log if comment editing failed
         if not comment_return:
             logging.error("%s:%s: Failed to edit comment with winners.", identifier, requester)
         logging.info("%s:%s: Completed, OK", identifier, requester)
+
+
+def start_jobs(identifier):
+    """ Schedules the PROCESS (PROCESS_MENTION) and UPDATE_NUMBERS jobs of a giveaway whose post is known."""
+    giveaway = _load(identifier, 'start_jobs')
+    if not giveaway:
+        return
+    requester = giveaway['requester']
+    giveaway_args = giveaway['giveaway_args']
+    if giveaway_args.is_mention:
+        job_id_mention = '%s:%s:PROCESS_MENTION' % (identifier, requester)
+        ids.add_job(identifier, job_id_mention)
+        utils.scheduler.add_job(run_process, id=job_id_mention, args=[identifier], executor=pools.HEAVY)
+        return
+    # schedule job to process giveaway
+    job_id = '%s:%s:PROCESS' % (identifier, requester)
+    ids.add_job(identifier, job_id)
+    utils.scheduler.add_job(run_process, 'date', run_date=giveaway_args.date, id=job_id, args=[identifier],
+                            executor=pools.HEAVY)
+
+    # if giveaway is of number type, create job to track numbers used
+    if giveaway['numbers_comment_id']:
+        job_id = '%s:%s:UPDATE_NUMBERS' % (identifier, requester)
+        ids.add_job(identifier, job_id)
+        utils.scheduler.add_job(run_update_numbers, 'interval', minutes=config.update_numbers_interval, id=job_id,
+                                args=[identifier], executor=pools.HEAVY)
+
+
+def finish(identifier):
+    """ Removes a giveaway that has ended or expired: the jobs it has left, its stored state and its identifier, which
+        can then be allocated again."""
+    for job_id in ids.jobs(identifier):
+        if utils.scheduler.get_job(job_id) is not None:
+            utils.scheduler.remove_job(job_id)
+    store.delete(identifier)
+    ids.release(identifier)
+
+
+def hand_off(identifier):
+    """ Starts the jobs of a ready giveaway in this process if its shard runs here, otherwise they are started by
+        the CLAIM job of the shard owning it."""
+    if shards.is_local(identifier) and store.claim(identifier, shards.current):
+        start_jobs(identifier)
+    else:
+        logging.info("%s: Handed to shard %s.", identifier, shards.owner(identifier))
+
+
+def claim_giveaways():
+    """ CLAIM job, starts the ready giveaways of this shard that were set up by shard 0."""
+    for identifier in store.claim_ready(shards.current):
+        logging.info("%s: Claimed by shard %s.", identifier, shards.current)
+        start_jobs(identifier)
+
+
+def _load(identifier, job):
+    """ Loads a stored giveaway for a scheduler job, logs an error if it is gone."""
+    giveaway = store.load(identifier)
+    if giveaway is None:
+        logging.error("%s: Giveaway not found. Ending <%s> process.", identifier, job)
+    return giveaway
+
+
+def _pending_posts():
+    """ Returns: [dict] requester -> identifiers of the giveaways still looking for their post, giveaways past
+                 config.check_post_timeout are dropped"""
+    for identifier, requester in store.stuck(config.scheduling_timeout * 60):
+        logging.warning("%s:%s: Giveaway scheduling did not complete.", identifier, requester)
+        _unschedule(identifier)
+    pending = {}
+    timeout = time.time() - config.check_post_timeout * 60
+    for identifier, requester, created in store.pending():
+        if utils.scheduler.get_job('%s:%s:CHECK_POST' % (identifier, requester)):
+            continue  # set up by an older version, still checked by its own CHECK_POST job
+        if created < timeout:
+            logging.info("%s:%s: Giveaway post not found within the time limit.", identifier, requester)
+            finish(identifier)
+            continue
+        pending.setdefault(requester, []).append(identifier)
+    return pending
+
+
+def _post_found(identifier, post):
+    """ Schedules a giveaway found by DISCOVER_POSTS in its post. Errors are logged, they must not stop the pass for
+        the other giveaways."""
+    try:
+        giveaway = _load(identifier, '_post_found')
+        # no longer pending before the comment is posted, a failure below must not lead to a second comment
+        if not giveaway or not store.start_scheduling(identifier):
+            return
+    except Exception:
+        logging.exception("%s: Failed to schedule giveaway found in post: %s", identifier, post.id)
+        return
+    try:
+        logging.info("%s:%s: Giveaway post found, scheduling giveaway.", identifier, giveaway['requester'])
+        schedule(giveaway['requester'], identifier, giveaway['giveaway_args'], giveaway['codes'], post)
+    except Exception:
+        logging.exception("%s: Failed to schedule giveaway found in post: %s", identifier, post.id)
+        _unschedule(identifier)
+
+
+def _unschedule(identifier):
+    """ Puts a giveaway whose scheduling failed back to looking for its post, or ends it if its comment was posted
+        already (posting it again would leave two comments). Giveaways that got to 'ready' are started by CLAIM."""
+    try:
+        if store.stop_scheduling(identifier):
+            logging.info("%s: Giveaway looking for its post again.", identifier)
+        elif store.status(identifier) == 'scheduling':
+            logging.error("%s: Giveaway comment posted but scheduling failed. Ending giveaway.", identifier)
+            finish(identifier)
+    except Exception:
+        logging.exception("%s: Failed to reset giveaway, it is retried once config.scheduling_timeout is over.",
+                          identifier)
+
+
+def discover_posts():
+    """ DISCOVER_POSTS job, fetches the recent posts of every requester with giveaways waiting for their post once
+        and matches all their identifiers in a single pass."""
+    for requester, identifiers in _pending_posts().items():
+        discovery = tracing.span(requester, tracing.DISCOVERY)
+        submissions = reddit.recent_submissions(requester, 'DISCOVER_POSTS')
+        found = {}
+        if submissions is not None:
+            found = reddit.find_giveaway_posts(submissions, identifiers, requester)
+        # one fetch serves all identifiers of the requester, each gets the span
+        discovery.stop(submissions is None, identifiers)
+        if submissions is None:
+            logging.error("DISCOVER_POSTS:%s: Unable to check for giveaway posts of: %s", requester,
+                          ', '.join(identifiers))
+            continue
+        for identifier, post in found.items():
+            _post_found(identifier, post)
+
+
+async def discover_posts_async():
+    """ DISCOVER_POSTS job of the asyncio runtime, the posts of all requesters are fetched concurrently."""
+    pending = _pending_posts()
+    discovery = tracing.span(None, tracing.DISCOVERY)
+    results = await asyncio.gather(*[aioreddit.recent_submissions(requester, 'DISCOVER_POSTS')
+                                     for requester in pending])
+    loop = asyncio.get_running_loop()
+    for (requester, identifiers), submissions in zip(pending.items(), results):
+        discovery.stop(submissions is None, identifiers)
+        if submissions is None:
+            logging.error("DISCOVER_POSTS:%s: Unable to check for giveaway posts of: %s", requester,
+                          ', '.join(identifiers))
+            continue
+        for identifier, post in reddit.find_giveaway_posts(submissions, identifiers, requester).items():
+            # schedule comments through praw, hand it a praw submission
+            await loop.run_in_executor(None, _post_found, identifier, reddit.get_post(post.id))
+
+
+def run_check_post(identifier):
+    """ CHECK_POST job of giveaways set up before DISCOVER_POSTS, looks for the post of a stored giveaway."""
+    giveaway = _load(identifier, 'run_check_post')
+    if giveaway:
+        reddit.check_post(giveaway['requester'], identifier, giveaway['giveaway_args'], giveaway['codes'])
+
+
+async def run_check_post_async(identifier):
+    """ CHECK_POST job of the asyncio runtime for giveaways set up before DISCOVER_POSTS."""
+    giveaway = _load(identifier, 'run_check_post_async')
+    if giveaway:
+        await aioreddit.check_post(giveaway['requester'], identifier, giveaway['giveaway_args'], giveaway['codes'])
+
+
+def end_setup(identifier):
+    """ END_JOB job, stops looking for the giveaway post once config.check_post_timeout is reached."""
+    giveaway = _load(identifier, 'end_setup')
+    if giveaway:
+        job_id_checkpost = '%s:%s:CHECK_POST' % (identifier, giveaway['requester'])
+        utils.end_job(job_id_checkpost, "Giveaway post not found within the time limit.")
+        finish(identifier)
+
+
+def run_process(identifier):
+    """ PROCESS and PROCESS_MENTION job, runs a stored giveaway and removes it once done."""
+    giveaway = _load(identifier, 'run_process')
+    if giveaway:
+        try:
+            with ratelimit.priority(ratelimit.HIGH):
+                process(giveaway['requester'], identifier, giveaway['giveaway_args'], giveaway['codes'],
+                        reddit.get_post(giveaway['post_id']), reddit.get_comment(giveaway['comment_id']))
+        finally:
+            finish(identifier)
+
+
+def run_update_numbers(identifier):
+    """ UPDATE_NUMBERS job, refreshes the used numbers of a stored number giveaway."""
+    giveaway = _load(identifier, 'run_update_numbers')
+    if giveaway:
+        with ratelimit.priority(ratelimit.LOW), tracing.span(identifier, tracing.NUMBER_REFRESH):
+            utils.update_numbers(giveaway['requester'], identifier, giveaway['giveaway_args'],
+                                 reddit.get_post(giveaway['post_id']),
+                                 reddit.get_comment(giveaway['numbers_comment_id']))
@@ -0,0 +1,122 @@
+import logging
+import sqlite3
+import time
+
+import database
+
+# giveaway identifiers in use and the scheduler jobs of each, an identifier is only handed out again once released.
+# identifiers are dense: the lowest released one is reused first, otherwise the next one of the sequence is taken
+_first = 100000
+_last = 999999
+_seeded = False
+
+
+def _setup():
+    global _seeded
+    database.setup('ids', [
+        'CREATE TABLE IF NOT EXISTS identifiers (identifier TEXT PRIMARY KEY, requester TEXT, allocated REAL)',
+        'CREATE TABLE IF NOT EXISTS identifier_jobs ('
+        'identifier TEXT, job_id TEXT, PRIMARY KEY (identifier, job_id)) WITHOUT ROWID',
+        'CREATE TABLE IF NOT EXISTS free_identifiers (identifier TEXT PRIMARY KEY) WITHOUT ROWID',
+        'CREATE TABLE IF NOT EXISTS identifier_sequence (id INTEGER PRIMARY KEY, next INTEGER)',
+        'INSERT OR IGNORE INTO identifier_sequence (id, next) VALUES (0, %s)' % _first])
+    # legacy: reserved by _seed() for a scheduler job of an older version, released by sweep()
+    database.add_columns('identifiers', ['legacy INTEGER'])
+    if not _seeded:
+        _seeded = True
+        _seed()
+
+
+def _seed():
+    """ Reserves the identifiers of giveaways and scheduler jobs created before identifiers were allocated here."""
+    with database.transaction() as db:
+        tables = [row[0] for row in db.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND "
+                                               "(name = 'giveaways' OR name LIKE 'apscheduler_jobs%')")]
+        for table in tables:
+            if table == 'giveaways':
+                db.execute('INSERT OR IGNORE INTO identifiers (identifier, requester, allocated) '
+                           'SELECT identifier, requester, created FROM giveaways')
+                continue
+            # job ids look like identifier:requester:KIND
+            jobs = [row[0].split(':') + [row[0]] for row in db.execute("SELECT id FROM %s WHERE id LIKE '%%:%%:%%'"
+                                                                       % table)]
+            db.executemany('INSERT OR IGNORE INTO identifiers (identifier, requester, allocated, legacy) '
+                           'VALUES (?, ?, ?, 1)', [(job[0], job[1], time.time()) for job in jobs])
+            db.executemany('INSERT OR IGNORE INTO identifier_jobs (identifier, job_id) VALUES (?, ?)',
+                           [(job[0], job[-1]) for job in jobs])
+
+
+def allocate(requester):
+    """ Reserves a 6 digit identifier no other giveaway is using, the lowest released one or the next new one.
+        Parameters:
+            requester:  [string] reddit username
+        Returns: [string] identifier"""
+    _setup()
+    # other shards allocate from the same tables, under the write lock
+    with database.transaction(immediate=True) as db:
+        row = db.execute('SELECT MIN(identifier) FROM free_identifiers').fetchone()
+        if row[0] is not None:
+            identifier = row[0]
+            db.execute('DELETE FROM free_identifiers WHERE identifier = ?', (identifier,))
+            db.execute('INSERT OR REPLACE INTO identifiers (identifier, requester, allocated) VALUES (?, ?, ?)',
+                       (identifier, requester, time.time()))
+            return identifier
+        number = db.execute('SELECT next FROM identifier_sequence WHERE id = 0').fetchone()[0]
+        # identifiers reserved by _seed() can be in the way, each of them is skipped once
+        while number <= _last:
+            identifier = str(number)
+            number += 1
+            if db.execute('INSERT OR IGNORE INTO identifiers (identifier, requester, allocated) VALUES (?, ?, ?)',
+                          (identifier, requester, time.time())).rowcount == 1:
+                db.execute('UPDATE identifier_sequence SET next = ? WHERE id = 0', (number,))
+                return identifier
+    raise sqlite3.IntegrityError('all %s identifiers are in use' % (_last - _first + 1))
+
+
+def add_job(identifier, job_id):
+    """ Records a scheduler job of a giveaway, see jobs()."""
+    _setup()
+    database.execute('INSERT OR IGNORE INTO identifier_jobs (identifier, job_id) VALUES (?, ?)', (identifier, job_id))
+
+
+def jobs(identifier):
+    """ Returns: [list] of the scheduler job ids recorded for a giveaway"""
+    _setup()
+    return [row[0] for row in database.execute('SELECT job_id FROM identifier_jobs WHERE identifier = ?',
+                                               (identifier,))]
+
+
+def release(identifier):
+    """ Frees an identifier once its giveaway is over, forgetting its jobs. allocate() hands it out again."""
+    _setup()
+    with database.transaction() as db:
+        db.execute('DELETE FROM identifier_jobs WHERE identifier = ?', (identifier,))
+        if db.execute('DELETE FROM identifiers WHERE identifier = ?', (identifier,)).rowcount:
+            db.execute('INSERT OR IGNORE INTO free_identifiers (identifier) VALUES (?)', (identifier,))
+
+
+def sweep():
+    """ Releases the identifiers reserved for jobs of older versions once none of their jobs is left and they have no
+        stored giveaway: those jobs call giveaway.process directly and never reach giveaway.finish()."""
+    _setup()
+    with database.transaction() as db:
+        legacy = [row[0] for row in db.execute('SELECT identifier FROM identifiers WHERE legacy = 1')]
+        if not legacy:
+            return
+        stored, live = set(), set()
+        for table in [row[0] for row in db.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND "
+                                                   "(name = 'giveaways' OR name LIKE 'apscheduler_jobs%')")]:
+            if table == 'giveaways':
+                stored.update(row[0] for row in db.execute('SELECT identifier FROM giveaways'))
+            else:
+                live.update(row[0] for row in db.execute('SELECT id FROM %s' % table))
+        done = []
+        for identifier in legacy:
+            jobs = [row[0] for row in db.execute('SELECT job_id FROM identifier_jobs WHERE identifier = ?',
+                                                 (identifier,))]
+            if identifier not in stored and not live.intersection(jobs):
+                done.append(identifier)
+    for identifier in done:
+        release(identifier)
+    if done:
+        logging.info("Released %s identifiers of finished legacy jobs.", len(done))
@@ -1,44 +1,137 @@
+import time
+started = time.perf_counter()  # startup report, see config.startup_profile
+
+import asyncio
+import concurrent.futures
+import datetime
+import logging
+
+from apscheduler.events import EVENT_SCHEDULER_STARTED, EVENT_JOB_EXECUTED, EVENT_JOB_ERROR, EVENT_JOB_SUBMITTED
+from pytz import utc
 import reddit
 import utils
+import outbox
+import giveaway
+import ids
+import pools
+import metrics
+import shards
+import tracing
 import config
-import logging
-import time
 
+imported = time.perf_counter()
+
+
+def startup_report(event):
+    """ Logs how long the bot took to import, start the scheduler and finish its first inbox check."""
+    if event.code == EVENT_SCHEDULER_STARTED:
+        logging.info("Startup: imports %.2fs, scheduler started after %.2fs", imported - started,
+                     time.perf_counter() - started)
+    elif event.job_id == 'CHECK_INBOX':
+        logging.info("Startup: first inbox check done after %.2fs", time.perf_counter() - started)
+        utils.scheduler.remove_listener(startup_report)
+
+
+async def run_async():
+    """ Runs the scheduler on an asyncio event loop until the process is stopped."""
+    asyncio.get_running_loop().set_default_executor(
+        concurrent.futures.ThreadPoolExecutor(max_workers=config.async_thread_workers))
+    utils.scheduler.start()
+    await asyncio.Event().wait()
 
 
 if __name__ == '__main__':
-    logging.info("Starting giveaway script...")
-    utils.scheduler.add_job(
-        reddit.check_pms,
-        'interval',
-        minutes=config.check_pm_interval,
-        id='CHECK_PMS',
-        replace_existing=True
-    )
-    logging.info("Scheduled <check_pms> job at %s minutes interval.", config.check_pm_interval)
+    logging.info("Starting giveaway script... shard %s of %s", shards.current, config.shards)
+    if config.startup_profile:
+        utils.scheduler.add_listener(startup_report, EVENT_SCHEDULER_STARTED | EVENT_JOB_EXECUTED | EVENT_JOB_ERROR)
+    utils.scheduler.add_listener(metrics.job_submitted, EVENT_JOB_SUBMITTED)
+    if config.metrics_port:
+        # one port per shard worker
+        metrics.serve(config.metrics_host, config.metrics_port + shards.current)
+
+    workers = []
+    if shards.current == 0:
+        workers = shards.spawn()
+        utils.scheduler.add_job(
+            reddit.check_inbox,
+            'interval',
+            minutes=config.check_inbox_interval,
+            next_run_time=datetime.datetime.now(utc),  # poll right away instead of one interval after starting
+            id='CHECK_INBOX',
+            executor=pools.INBOX,
+            replace_existing=True
+        )
+        logging.info("Scheduled <check_inbox> job at %s minutes interval.", config.check_inbox_interval)
+
+        utils.scheduler.add_job(
+            giveaway.discover_posts_async if config.runtime == 'asyncio' else giveaway.discover_posts,
+            'interval',
+            minutes=config.check_post_interval,
+            id='DISCOVER_POSTS',
+            executor=pools.INBOX,
+            replace_existing=True
+        )
+        logging.info("Scheduled <discover_posts> job at %s minutes interval.", config.check_post_interval)
+
+        utils.scheduler.add_job(
+            utils.check_logs,
+            'interval',
+            minutes=config.check_logs,
+            id='CHECK_LOGS',
+            replace_existing=True
+        )
+        logging.info("Scheduled <check_logs> job at %s minutes interval.", config.check_logs)
+
+        utils.scheduler.add_job(
+            ids.sweep,
+            'interval',
+            minutes=config.ids_sweep_interval,
+            id='SWEEP_IDS',
+            replace_existing=True
+        )
+        logging.info("Scheduled <sweep_ids> job at %s minutes interval.", config.ids_sweep_interval)
+
+    if config.shards > 1:
+        utils.scheduler.add_job(
+            giveaway.claim_giveaways,
+            'interval',
+            seconds=config.claim_interval,
+            next_run_time=datetime.datetime.now(utc),
+            id='CLAIM',
+            executor=pools.INBOX,
+            replace_existing=True
+        )
+        logging.info("Scheduled <claim_giveaways> job at %s seconds interval.", config.claim_interval)
 
     utils.scheduler.add_job(
-        reddit.check_mentions,
+        outbox.drain_async if config.runtime == 'asyncio' else outbox.drain,
         'interval',
-        minutes=config.check_mentions_interval,
-        id='CHECK_MENTIONS',
+        minutes=config.outbox_interval,
+        id='OUTBOX',
         replace_existing=True
     )
-    logging.info("Scheduled <check_mentions> job at %s minutes interval.", config.check_mentions_interval)
+    logging.info("Scheduled <outbox> job at %s minutes interval.", config.outbox_interval)
 
     utils.scheduler.add_job(
-        utils.check_logs,
+        pools.log_stats,
         'interval',
-        minutes=config.check_logs,
-        id='CHECK_LOGS',
+        minutes=config.pool_stats_interval,
+        id='POOL_STATS',
         replace_existing=True
     )
-    logging.info("Scheduled <check_logs> job at %s minutes interval.", config.check_logs)
+    logging.info("Scheduled <pool_stats> job at %s minutes interval.", config.pool_stats_interval)
 
     try:
         logging.info("Launching scheduler...")
-        utils.scheduler.start()
+        if config.runtime == 'asyncio':
+            asyncio.run(run_async())
+        else:
+            utils.scheduler.start()
     except (KeyboardInterrupt, SystemExit):
         pass
+    finally:
+        for worker in workers:
+            worker.terminate()
+        tracing.flush()
 
-    logging.info("Exiting giveaway script...")
\ No newline at end of file
+    logging.info("Exiting giveaway script...")
@@ -0,0 +1,210 @@
+import http.server
+import logging
+import re
+import threading
+import time
+
+from prawcore import Requestor
+
+# in-process metrics in the Prometheus text format, served on config.metrics_port by serve()
+registry = []  # metrics in the order they are rendered
+_prefix = 'autogiveaway_'
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                             for name, value in zip(names, values))
+
+
+class Counter(object):
+    """ Value only going up, per combination of label values.
+        Parameters:
+            name:   [string] metric name, without the autogiveaway_ prefix
+            help:   [string] description
+            labels: [tuple] of label names"""
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = _prefix + name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}  # label values -> value
+        self._lock = threading.Lock()
+        registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(x, '') for x in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in sorted(self._values.items())]
+
+    def render_labels(self, name, key):
+        return _labels(self.labels, key)
+
+
+class Gauge(Counter):
+    """ Value going up and down, either set() or read from function at each scrape.
+        Parameters:
+            function: [function] returning [dict] of label values [tuple] -> value, called at each scrape"""
+    kind = 'gauge'
+
+    def __init__(self, name, help, labels=(), function=None):
+        super().__init__(name, help, labels)
+        self.function = function
+
+    def set(self, value, **labels):
+        key = tuple(labels.get(x, '') for x in self.labels)
+        with self._lock:
+            self._values[key] = value
+
+    def samples(self):
+        if self.function is None:
+            return super().samples()
+        try:
+            values = self.function()
+        except Exception as error:  # a broken gauge must not break the whole scrape
+            logging.error("Metric %s: %s", self.name, error)
+            return []
+        return [(self.name, key, value) for key, value in sorted(values.items())]
+
+
+class Histogram(Counter):
+    """ Observed values counted in cumulative buckets, with their sum and count.
+        Parameters:
+            buckets: [tuple] of bucket upper bounds, ascending"""
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300)):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(x, '') for x in self.labels)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [0] * len(self.buckets) + [0, 0.0]  # buckets, count, sum
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            counts[-2] += 1
+            counts[-1] += value
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, counts in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, counts):
+                    samples.append((self.name + '_bucket', key + (repr(float(bound)),), count))
+                samples.append((self.name + '_bucket', key + ('+Inf',), counts[-2]))
+                samples.append((self.name + '_count', key, counts[-2]))
+                samples.append((self.name + '_sum', key, counts[-1]))
+        return samples
+
+    def render_labels(self, name, key):
+        names = self.labels + ('le',) if name.endswith('_bucket') else self.labels
+        return _labels(names, key)
+
+
+def render():
+    """ Returns: [string] all metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in registry:
+        lines.append('# HELP %s %s' % (metric.name, metric.help))
+        lines.append('# TYPE %s %s' % (metric.name, metric.kind))
+        for name, key, value in metric.samples():
+            lines.append('%s%s %s' % (name, metric.render_labels(name, key), value))
+    return '\n'.join(lines) + '\n'
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # scrapes are not worth a log line each
+
+
+def serve(host, port):
+    """ Serves /metrics from a daemon thread.
+        Returns: [object] the HTTPServer, None if the port could not be opened"""
+    try:
+        server = http.server.ThreadingHTTPServer((host, port), _Handler)
+    except OSError as error:
+        logging.error("Metrics: unable to listen on %s:%s: %s", host, port, error)
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    logging.info("Metrics served on http://%s:%s/metrics", host, port)
+    return server
+
+
+def endpoint(url):
+    """ Returns: [string] path of a reddit API url with ids and names replaced, e.g. /comments/{id}"""
+    path = re.sub(r'^https?://[^/]+', '', url).split('?')[0].strip('/')
+    parts = path.split('/')
+    for index in range(1, len(parts)):
+        if parts[index - 1] in ('comments', 'user', 'u', 'r', 'by_id'):
+            parts[index] = '{id}'
+    return '/' + '/'.join(parts[:4])
+
+
+class MeteredRequestor(Requestor):
+    """ prawcore Requestor counting and timing every HTTP request praw makes, by endpoint and status."""
+
+    def request(self, *args, **kwargs):
+        url = args[1] if len(args) > 1 else kwargs.get('url', '')
+        name = endpoint(url)
+        start = time.perf_counter()
+        status = 'error'
+        try:
+            response = super().request(*args, **kwargs)
+            status = str(response.status_code)
+            return response
+        finally:
+            api_requests.inc(endpoint=name, status=status)
+            api_request_seconds.observe(time.perf_counter() - start, endpoint=name)
+
+
+def job_kind(job_id):
+    """ Returns: [string] job label of a scheduler job id: CHECK_INBOX, PROCESS, ... 'other' for unnamed jobs"""
+    if job_id and ':' in job_id:
+        return job_id.rsplit(':', 1)[1]
+    if job_id and job_id.isupper():
+        return job_id
+    return 'other'
+
+
+def job_submitted(event):
+    """ Scheduler listener of EVENT_JOB_SUBMITTED, observes how late jobs were handed to their executor."""
+    now = time.time()
+    for run_time in event.scheduled_run_times:
+        job_lag.observe(max(now - run_time.timestamp(), 0), job=job_kind(event.job_id))
+
+
+api_requests = Counter('api_requests_total', 'HTTP requests made to reddit', ('endpoint', 'status'))
+api_request_seconds = Histogram('api_request_seconds', 'Time reddit took to answer', ('endpoint',),
+                                buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30))
+api_retries = Counter('api_retries_total', 'Failed API calls that were retried or given up', ('error',))
+api_rate_limited = Counter('api_rate_limited_total', 'API calls reddit answered with a rate limit')
+api_budget_wait = Histogram('api_budget_wait_seconds', 'Time API calls waited for the shared budget', ('priority',),
+                            buckets=(0.01, 0.1, 0.5, 1, 5, 10, 30, 60, 300))
+job_lag = Histogram('job_lag_seconds', 'Time scheduler jobs were handed to their pool after their run time',
+                    ('job',))
+pool_wait = Histogram('pool_wait_seconds', 'Time jobs waited for a free thread', ('pool',))
+comments_harvested = Counter('comments_harvested_total', 'Top level comments fetched from giveaway posts')
+pms = Counter('pms_total', 'PMs sent, failed or scheduled for retry', ('result',))
@@ -0,0 +1,197 @@
+import asyncio
+import concurrent.futures
+import logging
+import threading
+import time
+
+import aioreddit
+import config
+import database
+import metrics
+import ratelimit
+import reddit
+
+# outbound PM queue, rows stay in the database until sent or out of retries so they survive restarts.
+# the body (giveaway codes) is cleared once a row is sent or given up, the row itself after config.outbox_retention
+_drain_lock = threading.Lock()
+_send_lock = threading.Lock()
+_last_send = 0
+_purged = 0
+
+
+def _setup():
+    database.setup('outbox', [
+        'CREATE TABLE IF NOT EXISTS outbox ('
+        'id INTEGER PRIMARY KEY AUTOINCREMENT, identifier TEXT, requester TEXT, recipient TEXT, '
+        'subject TEXT, body TEXT, status TEXT, attempts INTEGER, next_attempt REAL, updated REAL)',
+        'CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt)'])
+    # claimed: when a drain marked the row 'sending', rows still 'sending' after config.outbox_lease were lost by a
+    # stopped process and are claimed again, see _claim()
+    database.add_columns('outbox', ['claimed REAL'])
+
+
+def _depths():
+    _setup()
+    return dict(((status,), count) for status, count in
+                database.execute('SELECT status, COUNT(*) FROM outbox GROUP BY status'))
+
+
+metrics.Gauge('outbox_pms', 'PMs in the outbox by status', ('status',), function=_depths)
+
+
+def enqueue(requester, identifier, pms):
+    """ Queues PMs to be sent by drain().
+        Parameters:
+            requester:  [string] redditor doing giveaway
+            identifier: [string] unique 6 digit
+            pms:        [list] of PMs [recipient, subject, message, identifier]"""
+    now = time.time()
+    _setup()
+    database.executemany("INSERT INTO outbox (identifier, requester, recipient, subject, body, status, attempts, "
+                         "next_attempt, updated) VALUES (?, ?, ?, ?, ?, 'pending', 0, ?, ?)",
+                         [(pm[3], requester, pm[0], pm[1], pm[2], now, now) for pm in pms])
+    logging.info("%s:%s: %s PMs queued.", identifier, requester, len(pms))
+
+
+def summary(identifier):
+    """ Returns: [dict] of PM status -> number of PMs for a giveaway"""
+    _setup()
+    return dict(database.execute('SELECT status, COUNT(*) FROM outbox WHERE identifier = ? GROUP BY status',
+                                 (str(identifier),)))
+
+
+def _send_interval():
+    """ Returns: [float] seconds between PMs, every shard gets its share of config.pm_per_minute"""
+    return 60.0 * config.shards / config.pm_per_minute
+
+
+def _throttle():
+    """ Spaces out PM sends to stay within config.pm_per_minute."""
+    global _last_send
+    # each PM reserves its send slot under the lock and waits for it outside, the other workers are not held up
+    with _send_lock:
+        now = time.time()
+        _last_send = max(now, _last_send + _send_interval())
+        wait = _last_send - now
+    if wait > 0:
+        time.sleep(wait)
+
+
+def _record(row, sent):
+    """ Stores the outcome of a send attempt."""
+    message_id, identifier, requester, recipient, subject, body, attempts = row
+    attempts += 1
+    if sent:
+        database.execute("UPDATE outbox SET status = 'sent', body = NULL, attempts = ?, updated = ? WHERE id = ?",
+                         (attempts, time.time(), message_id))
+    elif attempts >= config.retry_failed_pms_retries:
+        logging.error("%s:%s: Retry: %s -- Failed to send PM to: %s, giving up.", identifier, requester, attempts,
+                      recipient)
+        database.execute("UPDATE outbox SET status = 'failed', body = NULL, attempts = ?, updated = ? WHERE id = ?",
+                         (attempts, time.time(), message_id))
+    else:
+        logging.error("%s:%s: Retry: %s -- PM Failed to be sent to: %s, will retry in %s minutes.",
+                      identifier, requester, attempts, recipient, config.retry_failed_pms_wait_time)
+        database.execute("UPDATE outbox SET status = 'pending', attempts = ?, next_attempt = ?, updated = ? "
+                         "WHERE id = ?",
+                         (attempts, time.time() + config.retry_failed_pms_wait_time * 60, time.time(), message_id))
+
+
+def _send(row):
+    message_id, identifier, requester, recipient, subject, body, attempts = row
+    _throttle()
+    # one attempt per drain, failed PMs stay queued for the next one
+    with ratelimit.priority(ratelimit.HIGH):
+        _record(row, reddit.send_pm(recipient, subject, body, identifier, requester, tries=config.retries - 1))
+
+
+def _purge():
+    """ Deletes the sent and failed PMs older than config.outbox_retention days, once an hour."""
+    global _purged
+    if time.time() - _purged < 3600:
+        return
+    _purged = time.time()
+    database.execute("DELETE FROM outbox WHERE status IN ('sent', 'failed') AND updated < ?",
+                     (time.time() - config.outbox_retention * 86400,))
+
+
+def _claim():
+    """ Returns: [list] of due PM rows, marked as being sent"""
+    _setup()
+    _purge()
+    now = time.time()
+    # no more than half the lease can send, the rest is left to the next drain
+    limit = max(int(config.outbox_lease * config.pm_per_minute / config.shards / 2), config.pm_workers)
+    # other shards drain the same table, rows are selected and marked under the write lock
+    with database.transaction(immediate=True) as db:
+        rows = db.execute("SELECT id, identifier, requester, recipient, subject, body, attempts FROM outbox "
+                          "WHERE status = 'pending' AND next_attempt <= ? OR "
+                          "status = 'sending' AND (claimed IS NULL OR claimed < ?) ORDER BY id LIMIT ?",
+                          (now, now - config.outbox_lease * 60, limit)).fetchall()
+        db.executemany("UPDATE outbox SET status = 'sending', claimed = ? WHERE id = ?",
+                       [(now, row[0]) for row in rows])
+    return rows
+
+
+def _failed(row, error):
+    logging.error("%s:%s: Failed to send queued PM to %s: %s", row[1], row[2], row[3], error)
+    _record(row, False)  # counts as an attempt, retried after config.retry_failed_pms_wait_time
+
+
+def drain():
+    """ Sends all queued PMs that are due, config.pm_workers at a time."""
+    if not _drain_lock.acquire(blocking=False):
+        return  # another drain is already sending
+    try:
+        rows = _claim()
+        if not rows:
+            return
+        logging.info("Sending %s queued PMs...", len(rows))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=config.pm_workers) as executor:
+            futures = [(row, executor.submit(_send, row)) for row in rows]
+            for row, future in futures:
+                error = future.exception()
+                if error:
+                    _failed(row, error)
+        logging.info("Completed")
+    finally:
+        _drain_lock.release()
+
+
+async def _throttle_async():
+    """ _throttle() for the event loop, each PM reserves its send slot before waiting for it."""
+    global _last_send
+    now = time.time()
+    _last_send = max(now, _last_send + _send_interval())
+    await asyncio.sleep(_last_send - now)
+
+
+async def drain_async():
+    """ drain() for the asyncio runtime, due PMs are sent from the event loop, config.pm_workers in flight at once."""
+    if not _drain_lock.acquire(blocking=False):
+        return  # another drain is already sending
+    # sqlite calls can wait up to config.database_timeout for other shards, they run in worker threads
+    loop = asyncio.get_running_loop()
+    try:
+        rows = await loop.run_in_executor(None, _claim)
+        if not rows:
+            return
+        logging.info("Sending %s queued PMs...", len(rows))
+        in_flight = asyncio.Semaphore(config.pm_workers)
+
+        async def send(row):
+            message_id, identifier, requester, recipient, subject, body, attempts = row
+            async with in_flight:
+                await _throttle_async()
+                with ratelimit.priority(ratelimit.HIGH):
+                    sent = await aioreddit.send_pm(recipient, subject, body, identifier, requester,
+                                                   tries=config.retries - 1)
+                await loop.run_in_executor(None, _record, row, sent)
+
+        results = await asyncio.gather(*[send(row) for row in rows], return_exceptions=True)
+        for row, error in zip(rows, results):
+            if isinstance(error, Exception):
+                await loop.run_in_executor(None, _failed, row, error)
+        logging.info("Completed")
+    finally:
+        _drain_lock.release()
@@ -0,0 +1,106 @@
+import collections
+import concurrent.futures
+import logging
+import threading
+import time
+
+from apscheduler.executors.pool import BasePoolExecutor
+
+import config
+import metrics
+import ratelimit
+
+# scheduler executors per job class, so inbox polling and post checks never queue behind draws and number updates
+INBOX = 'inbox'  # CHECK_INBOX, DISCOVER_POSTS, CLAIM
+HEAVY = 'heavy'  # PROCESS, PROCESS_MENTION, UPDATE_NUMBERS
+DEFAULT = 'default'  # everything else: OUTBOX, CHECK_LOGS, retries
+
+pools = {}  # executor alias -> JobPool
+
+
+class JobPool(concurrent.futures.ThreadPoolExecutor):
+    """ Thread pool of one job class keeping its queue depth and how long jobs waited for a free thread.
+        Parameters:
+            name:           [string] executor alias
+            max_workers:    [int] number of threads"""
+
+    def __init__(self, name, max_workers):
+        super().__init__(max_workers, thread_name_prefix=name)
+        self.name = name
+        self.max_workers = max_workers
+        self.queued = 0
+        self.running = 0
+        self.jobs = 0
+        self.waits = collections.deque(maxlen=config.pool_wait_samples)  # seconds waited by the latest jobs
+        self._stats_lock = threading.Lock()
+
+    def submit(self, fn, *args, **kwargs):
+        submitted = time.monotonic()
+        with self._stats_lock:
+            self.queued += 1
+
+        def run():
+            waited = time.monotonic() - submitted
+            with self._stats_lock:
+                self.queued -= 1
+                self.running += 1
+                self.jobs += 1
+                self.waits.append(waited)
+            metrics.pool_wait.observe(waited, pool=self.name)
+            if waited > config.pool_wait_warning:
+                logging.warning("%s pool: job waited %.1f seconds for a free thread.", self.name, waited)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._stats_lock:
+                    self.running -= 1
+
+        return super().submit(run)
+
+    def stats(self):
+        """ Returns: [dict] of queued, running, jobs and average / max wait in seconds of the latest jobs"""
+        with self._stats_lock:
+            waits = list(self.waits)
+            return {'queued': self.queued, 'running': self.running, 'workers': self.max_workers, 'jobs': self.jobs,
+                    'avg_wait': round(sum(waits) / len(waits), 3) if waits else 0.0,
+                    'max_wait': round(max(waits), 3) if waits else 0.0}
+
+
+class JobPoolExecutor(BasePoolExecutor):
+    """ apscheduler executor running jobs in a JobPool."""
+
+    def __init__(self, name, max_workers):
+        pool = JobPool(name, max_workers)
+        pools[name] = pool
+        super().__init__(pool)
+
+
+def executors(runtime):
+    """ Returns: [dict] of executor alias -> apscheduler executor for the scheduler of config.runtime"""
+    if runtime == 'asyncio':
+        from apscheduler.executors.asyncio import AsyncIOExecutor
+        # coroutine jobs run on the event loop, heavy jobs get their own threads apart from the loop's pool
+        return {DEFAULT: AsyncIOExecutor(), INBOX: AsyncIOExecutor(),
+                HEAVY: JobPoolExecutor(HEAVY, config.heavy_workers)}
+    return {DEFAULT: JobPoolExecutor(DEFAULT, config.default_workers),
+            INBOX: JobPoolExecutor(INBOX, config.inbox_workers),
+            HEAVY: JobPoolExecutor(HEAVY, config.heavy_workers)}
+
+
+def _depths():
+    depths = {}
+    for name, pool in pools.items():
+        stats = pool.stats()
+        depths[(name, 'queued')] = stats['queued']
+        depths[(name, 'running')] = stats['running']
+    return depths
+
+
+metrics.Gauge('pool_jobs', 'Jobs queued for / running in each pool', ('pool', 'state'), function=_depths)
+
+
+def log_stats():
+    """ POOL_STATS job, logs queue depth and wait times of every pool."""
+    for name, pool in sorted(pools.items()):
+        logging.info("%s pool: %s", name, pool.stats())
+    logging.info("API budget: %s", ratelimit.budget.stats())
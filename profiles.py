@@ -0,0 +1,69 @@
+import collections
+import logging
+import sqlite3
+import threading
+import time
+
+
+class ProfileCache(object):
+    """ Size bounded LRU cache of redditor profiles (karma and account creation date) with a time to live.
+        When a database path is given profiles are also kept in SQLite so they survive restarts.
+        Parameters:
+            size:   [int] maximum number of profiles kept in memory
+            ttl:    [int] (in seconds) how long a profile stays valid
+            path:   [string] SQLite database file, None to keep profiles in memory only"""
+
+    def __init__(self, size, ttl, path=None):
+        self.size = size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._profiles = collections.OrderedDict()  # username -> (fetched, link_karma, comment_karma, created_utc)
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute('CREATE TABLE IF NOT EXISTS profiles ('
+                             'username TEXT PRIMARY KEY, fetched REAL, link_karma INTEGER, '
+                             'comment_karma INTEGER, created_utc REAL)')
+            self._db.commit()
+
+    def get(self, username):
+        """ Returns: (link_karma, comment_karma, created_utc) of a redditor, None if not cached or expired"""
+        now = time.time()
+        with self._lock:
+            profile = self._profiles.get(username)
+            if profile is None and self._db:
+                profile = self._db.execute('SELECT fetched, link_karma, comment_karma, created_utc FROM profiles '
+                                           'WHERE username = ?', (username,)).fetchone()
+                if profile:
+                    self._store(username, tuple(profile))
+            if profile is None or now - profile[0] > self.ttl:
+                self.misses += 1
+                return None
+            self._profiles.move_to_end(username)
+            self.hits += 1
+            return profile[1:]
+
+    def put(self, username, link_karma, comment_karma, created_utc):
+        """ Caches a freshly fetched redditor profile."""
+        profile = (time.time(), link_karma, comment_karma, created_utc)
+        with self._lock:
+            self._store(username, profile)
+            if self._db:
+                try:
+                    self._db.execute('INSERT OR REPLACE INTO profiles VALUES (?, ?, ?, ?, ?)', (username,) + profile)
+                    self._db.commit()
+                except sqlite3.Error as error:
+                    logging.error("Failed to save profile of %s: %s", username, error)
+
+    def stats(self):
+        """ Returns: [dict] with cache hits, misses and number of profiles in memory"""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._profiles)}
+
+    def _store(self, username, profile):
+        self._profiles[username] = profile
+        self._profiles.move_to_end(username)
+        while len(self._profiles) > self.size:
+            self._profiles.popitem(last=False)
@@ -0,0 +1,171 @@
+import asyncio
+import contextlib
+import contextvars
+import logging
+import threading
+import time
+
+import config
+import metrics
+
+# shared reddit API request budget, every API call made through retry.call / aioreddit.call takes a token first.
+# Waiting callers are served by priority: draws and PMs first, number updates last.
+HIGH = 0  # giveaway draws (comments, account checks) and PM delivery
+NORMAL = 1  # inbox, post discovery, setup
+LOW = 2  # update_numbers refreshes
+names = ('high', 'normal', 'low')
+
+_priority = contextvars.ContextVar('priority', default=NORMAL)
+
+
+@contextlib.contextmanager
+def priority(level):
+    """ API calls made inside the block, and by executor work submitted with contextvars.copy_context(), wait for
+        the budget at this priority."""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class Budget(object):
+    """ Token bucket of API requests, refilled at a steady rate and corrected with what reddit reports as remaining.
+        Parameters:
+            per_minute: [float] requests per minute
+            burst:      [int] most requests made back to back
+            reserve:    [int] tokens LOW priority calls leave for the others"""
+
+    def __init__(self, per_minute, burst, reserve):
+        self.base_rate = per_minute / 60.0
+        self.rate = self.base_rate
+        self.capacity = burst
+        self.reserve = reserve
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.slow_until = 0  # monotonic time the reddit reported budget resets, base_rate after that
+        self.paused_until = 0
+        self.waiting = [0, 0, 0]  # callers waiting per priority
+        self.waited = [0.0, 0.0, 0.0]  # total seconds waited per priority
+        self.taken = [0, 0, 0]
+        self._condition = threading.Condition()
+
+    def _refill(self, now):
+        if self.slow_until and now >= self.slow_until:
+            self.rate = self.base_rate
+            self.slow_until = 0
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _take(self, level, cost):
+        """ Returns: 0 if the tokens were taken, otherwise [float] seconds to wait before trying again"""
+        now = time.monotonic()
+        self._refill(now)
+        if now < self.paused_until:
+            return self.paused_until - now
+        if any(self.waiting[:level]):
+            return 0.05  # a higher priority caller goes first
+        needed = cost + (self.reserve if level == LOW else 0)
+        if self.tokens < needed:
+            return (needed - self.tokens) / self.rate
+        self.tokens -= cost
+        self.taken[level] += 1
+        return 0
+
+    def acquire(self, level=None, cost=1):
+        """ Blocks until cost tokens are available for the priority level, the caller's priority() by default.
+            Returns: [float] seconds waited"""
+        level = _priority.get() if level is None else level
+        started = time.monotonic()
+        with self._condition:
+            wait = self._take(level, cost)
+            if wait:
+                self.waiting[level] += 1
+                try:
+                    while wait:
+                        self._condition.wait(wait)
+                        wait = self._take(level, cost)
+                finally:
+                    self.waiting[level] -= 1
+                    self._condition.notify_all()
+            waited = time.monotonic() - started
+            self.waited[level] += waited
+        metrics.api_budget_wait.observe(waited, priority=names[level])
+        return waited
+
+    async def acquire_async(self, level=None, cost=1):
+        """ acquire() for the event loop, waits with asyncio.sleep.
+            Returns: [float] seconds waited"""
+        level = _priority.get() if level is None else level
+        started = time.monotonic()
+        with self._condition:
+            wait = self._take(level, cost)
+            if wait:
+                self.waiting[level] += 1
+        if wait:
+            try:
+                while wait:
+                    await asyncio.sleep(wait)
+                    with self._condition:
+                        wait = self._take(level, cost)
+            finally:
+                with self._condition:
+                    self.waiting[level] -= 1
+                    self._condition.notify_all()
+        waited = time.monotonic() - started
+        with self._condition:
+            self.waited[level] += waited
+        metrics.api_budget_wait.observe(waited, priority=names[level])
+        return waited
+
+    def observe(self, remaining, reset_timestamp):
+        """ Lowers the budget to what reddit reported in its rate limit headers, shared by all config.shards."""
+        if remaining is None or reset_timestamp is None:
+            return
+        seconds = max(reset_timestamp - time.time(), 1)
+        remaining = remaining / config.shards
+        with self._condition:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens = min(self.tokens, remaining)
+            if remaining / seconds < self.base_rate:
+                # spread what is left until the reset instead of running out early
+                self.rate = max(remaining / seconds, 0.01)
+                self.slow_until = now + seconds
+
+    def pause(self, seconds):
+        """ Stops all calls for seconds, after reddit answered with a rate limit error."""
+        with self._condition:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0
+        logging.warning("API budget: rate limited by reddit, pausing calls for %.0f seconds.", seconds)
+
+    def stats(self):
+        """ Returns: [dict] of tokens left, requests per minute, and calls taken / waiting / seconds waited per
+                     priority"""
+        with self._condition:
+            self._refill(time.monotonic())
+            return {'tokens': round(self.tokens, 1), 'per_minute': round(self.rate * 60, 1),
+                    'taken': list(self.taken), 'waiting': list(self.waiting),
+                    'waited': [round(x, 1) for x in self.waited]}
+
+
+def track(auth):
+    """ Registers the Auth object (Reddit.auth) of an API client whose rate limit figures update() reads."""
+    _clients.append(auth)
+
+
+def update():
+    """ Corrects the budget with the rate limit figures reddit sent with the latest responses."""
+    for auth in _clients:
+        limits = auth.limits
+        budget.observe(limits['remaining'], limits['reset_timestamp'])
+
+
+_clients = []
+# each shard gets its share of the account's budget
+budget = Budget(config.api_requests_per_minute / config.shards, config.api_burst, config.api_low_priority_reserve)
+metrics.Gauge('api_budget_tokens', 'API calls that can be made right away',
+              function=lambda: {(): budget.stats()['tokens']})
+metrics.Gauge('api_budget_waiting', 'API calls waiting for the budget', ('priority',),
+              function=lambda: dict(((x,), y) for x, y in zip(names, budget.stats()['waiting'])))
@@ -1,4 +1,5 @@
 import logging
+import re
 import praw
 from prawcore.exceptions import PrawcoreException
 from praw.exceptions import APIException, ClientException, PRAWException
@@ -6,61 +7,118 @@ import auth
 import giveaway
 import utils
 import config
+from profiles import ProfileCache
+from spec import GiveawayArgs
+import ratelimit
+import retry
+import tracing
+import metrics
 import datetime
 import collections
-import time
+import operator
+import concurrent.futures
+import contextvars
+import threading
+from praw.models import Message, MoreComments
+
+
+# praw.Reddit and the profile cache are created on first use, see client() and profiles()
+_reddit = None
+_profile_cache = None
+_clients_lock = threading.Lock()
+
+# per-post comment store used by unique_users, post id -> cursor and first comment per author
+comment_store = {}
+comment_store_lock = threading.Lock()
+
+# what unique_users keeps of a comment instead of the praw object: author name, date, start of the body, id and the
+# first number of the whole body (None if it has none) for number giveaways.
+# body holds at least config.comment_character_limit characters so the keyword length check still holds
+CommentRecord = collections.namedtuple('CommentRecord', ('author', 'created_utc', 'body', 'id', 'number'))
+
+
+def client():
+    """ Returns: [object] praw.Reddit of the bot account, created on first use"""
+    global _reddit
+    if _reddit is None:
+        with _clients_lock:
+            if _reddit is None:
+                _reddit = praw.Reddit(user_agent=auth.my_user_agent,
+                                      client_id=auth.my_client_id,
+                                      client_secret=auth.my_client_secret,
+                                      username=auth.my_username,
+                                      password=auth.my_password,
+                                      requestor_class=metrics.MeteredRequestor)
+                ratelimit.track(_reddit.auth)
+    return _reddit
+
+
+def use_client(backend):
+    """ Makes every call go through backend instead of praw.Reddit, e.g. benchmarks.fakereddit.FakeReddit for runs
+        without reddit. backend offers the praw.Reddit attributes used here: comment(), submission(), redditor(),
+        subreddit(), inbox and auth."""
+    global _reddit
+    with _clients_lock:
+        _reddit = backend
+    ratelimit.track(backend.auth)
+
+
+def profiles():
+    """ Returns: [object] ProfileCache of redditor karma / account age shared by all giveaways, created on first use"""
+    global _profile_cache
+    if _profile_cache is None:
+        with _clients_lock:
+            if _profile_cache is None:
+                _profile_cache = ProfileCache(config.profile_cache_size, config.profile_cache_ttl * 60,
+                                              config.profile_cache_db)
+    return _profile_cache
 
 
-reddit = praw.Reddit(user_agent=auth.my_user_agent,
-                     client_id=auth.my_client_id,
-                     client_secret=auth.my_client_secret,
-                     username=auth.my_username,
-                     password=auth.my_password)
-
 def get_comment(comment_id):
     """Fetches an updated comment from reddit"""
-    comment = reddit.comment(id=comment_id)
+    comment = client().comment(id=comment_id)
     return comment
 
 
 def get_post(post_id):
     """Fetches an updated post from reddit"""
-    post = reddit.submission(id=post_id)
+    post = client().submission(id=post_id)
     return post
 
 
 def make_link_post(title, link):
     """Makes a link post in 'autogiveaway' """
-    post = reddit.subreddit('autogiveaway').submit(title, url=link, send_replies=False)
+    post = client().subreddit('autogiveaway').submit(title, url=link, send_replies=False)
     return post
 
 
-def check_pms():
-    """ Checks inbox for new PMs in bot account with subject 'giveaway'"""
-    logging.info("Checking for new PMs...")
+def check_inbox():
+    """ Checks the unread inbox once for new giveaway PMs (subject 'giveaway') and user mentions, then marks the PMs
+        and mentions that were handled read in one request. Comment and post replies are left unread for the account
+        owner."""
+    logging.info("Checking inbox...")
+    read = []
+    ratelimit.budget.acquire()
     try:
-        for pm in reddit.inbox.messages(limit=25):
-            if pm.dest.lower() == auth.my_username and pm.new:
-                if pm.subject.lower() == 'giveaway':
-                    giveaway.process_pm(pm)
+        for item in client().inbox.unread(limit=config.inbox_limit):
+            if isinstance(item, Message):
+                if item.dest.lower() != auth.my_username:
+                    continue
+                read.append(item)
+                if item.subject.lower() == 'giveaway':
+                    giveaway.process_pm(item)
                 else:
-                    logging.info("%s:%s: Skipping pm, not a giveaway, subject: \"%s\".", pm.id, pm.author, pm.subject)
-                pm.mark_read()
-    except (APIException, ClientException, PRAWException, PrawcoreException) as error:
-        logging.error("%s", error)
-    logging.info("Completed")
-
-
-def check_mentions():
-    """ Checks inbox for new user mentions."""
-    logging.info("Checking for new User Mentions...")
-    try:
-        for mention in reddit.inbox.mentions(limit=25):
-            if mention.new:
-                giveaway.process_mention(mention)
-            mention.mark_read()
+                    logging.info("%s:%s: Skipping pm, not a giveaway, subject: \"%s\".", item.id, item.author,
+                                 item.subject)
+            elif item.subject.lower() == 'username mention':
+                read.append(item)
+                giveaway.process_mention(item)
     except (APIException, ClientException, PRAWException, PrawcoreException) as error:
         logging.error("%s", error)
+    finally:
+        # whatever was handled is marked read even if a later item failed, so it is not processed twice
+        if read:
+            retry.call(lambda: client().inbox.mark_read(read), 'INBOX', auth.my_username)
     logging.info("Completed")
 
 
@@ -69,66 +127,87 @@ def check_post(requester, identifier, giveaway_args, codes):
         Parameters:
             requester:      [string] redditor doing giveaway
             identifier:     [string] unique 6 digit
-            giveaway_args:  [list] parsed giveaway arguments
+            giveaway_args:  [object] GiveawayArgs of parsed giveaway arguments
             codes:          [list] giveaway codes
         Returns: True / False"""
-    tries = 0
-    redditor = None
-    submissions = None
-    wait_time = config.wait_time
-
     logging.info("%s:%s: Checking for giveaway post...", identifier, requester)
 
-    while not redditor or not submissions and tries < config.retries:
-        try:
-            redditor = reddit.redditor(requester)
-            submissions = list(redditor.submissions.new(limit=config.submissions_limit))
-        except (APIException, ClientException, PRAWException, PrawcoreException) as error:
-            logging.error("%s:%s: %s", identifier, requester, error)
-            logging.info("%s:%s: waiting %s seconds before retrying. Retry #: %s", identifier, requester, wait_time, tries)
-            time.sleep(wait_time)
-            wait_time = wait_time * config.backoff_multiplier
-            tries += 1
-
-    if redditor and submissions:
-        giveaway_post = None
-
-        # noinspection PyTypeChecker
-        for post in submissions:
-            title = post.title
-            content = post.selftext
-            post_id = post.id
-
-            foundidentifier = title.find(identifier)
-            if foundidentifier is -1:
-                foundidentifier = content.find(identifier)
-                if foundidentifier is -1:
-                    logging.info("%s:%s: No identifier found for post: %s", identifier, requester, post_id)
-                else:
-                    logging.info("%s%s: Identifier found in content for post: %s", identifier, requester, post_id)
-                    giveaway_post = post
-                    break
-            else:
-                logging.info("%s:%s: Identifier found in title for post: %s", identifier, requester, post_id)
-                giveaway_post = post
-                break
+    submissions = recent_submissions(requester, identifier)
 
+    if submissions is not None:
+        giveaway_post = find_giveaway_post(submissions, identifier, requester)
         if giveaway_post:
-            job_id_self = '%s:%s:CHECK_POST' % (identifier, requester)
-            job_id_end_job = '%s:%s:END_JOB' % (identifier, requester)
-            logging.info("%s:%s: Giveaway post found, scheduling giveaway.", identifier, requester)
-            giveaway.schedule(requester, identifier, giveaway_args, codes, giveaway_post)
-            utils.end_job(job_id_self,
-                          "Giveaway post found for Identifier: {0} : end_job:check_post".format(identifier))
-            utils.end_job(job_id_end_job,
-                          "Giveaway post found for Identifier: {0} : end_job:end_job".format(identifier))
-            logging.info("%s:%s: Completed, OK", identifier, requester)
+            giveaway_post_found(requester, identifier, giveaway_args, codes, giveaway_post)
         return True
     else:
         logging.error("%s%s: Unable to check for giveaway post.", identifier, requester)
         return False
 
 
+def recent_submissions(requester, identifier):
+    """ Returns: [list] of the newest config.submissions_limit posts of requester, None if they could not be fetched"""
+    # a single attempt per run, the next post check is the retry
+    return retry.call(lambda: list(client().redditor(requester).submissions.new(limit=config.submissions_limit)),
+                      identifier, requester, retries=1)
+
+
+def find_giveaway_posts(submissions, identifiers, requester):
+    """ Looks for several identifiers at once, each title and content is scanned a single time for all of them.
+        Parameters:
+            submissions:    [list] of posts from praw, newest first
+            identifiers:    [list] of identifiers [strings] waiting for their post
+            requester:      [string] redditor doing the giveaways
+        Returns: [dict] identifier -> first of submissions with the identifier in its title or content"""
+    # lookahead so overlapping identifiers are all found, longest first
+    pattern = re.compile('(?=(%s))' % '|'.join(re.escape(x) for x in sorted(identifiers, key=len, reverse=True)))
+    found = {}
+    for post in submissions:
+        for text in (post.title, post.selftext):
+            for identifier in pattern.findall(text):
+                if identifier not in found:
+                    logging.info("%s:%s: Identifier found for post: %s", identifier, requester, post.id)
+                    found[identifier] = post
+        if len(found) == len(identifiers):
+            break
+    return found
+
+
+def find_giveaway_post(submissions, identifier, requester):
+    """ Returns: the first of submissions with identifier in its title or content, None if there is none"""
+    # noinspection PyTypeChecker
+    for post in submissions:
+        title = post.title
+        content = post.selftext
+        post_id = post.id
+
+        foundidentifier = title.find(identifier)
+        if foundidentifier is -1:
+            foundidentifier = content.find(identifier)
+            if foundidentifier is -1:
+                logging.info("%s:%s: No identifier found for post: %s", identifier, requester, post_id)
+            else:
+                logging.info("%s%s: Identifier found in content for post: %s", identifier, requester, post_id)
+                return post
+        else:
+            logging.info("%s:%s: Identifier found in title for post: %s", identifier, requester, post_id)
+            return post
+    return None
+
+
+def giveaway_post_found(requester, identifier, giveaway_args, codes, giveaway_post):
+    """ Schedules the giveaway in its post and stops looking for the post."""
+    giveaway_args = GiveawayArgs.from_list(giveaway_args)  # jobs scheduled by older versions pass a list
+    job_id_self = '%s:%s:CHECK_POST' % (identifier, requester)
+    job_id_end_job = '%s:%s:END_JOB' % (identifier, requester)
+    logging.info("%s:%s: Giveaway post found, scheduling giveaway.", identifier, requester)
+    giveaway.schedule(requester, identifier, giveaway_args, codes, giveaway_post)
+    utils.end_job(job_id_self,
+                  "Giveaway post found for Identifier: {0} : end_job:check_post".format(identifier))
+    utils.end_job(job_id_end_job,
+                  "Giveaway post found for Identifier: {0} : end_job:end_job".format(identifier))
+    logging.info("%s:%s: Completed, OK", identifier, requester)
+
+
 def post_comment(post, message, identifier, requester):
     """ Posts comments.
         Parameters:
@@ -137,20 +216,8 @@ def post_comment(post, message, identifier, requester):
             identifier: [string] unique 6 digit
             requester:  [string] redditor doing giveaway
         Returns: True / False"""
-    tries = 0
-    comment = None
-    wait_time = config.wait_time
     message += config.footer_message
-
-    while not comment and tries < config.retries:
-        try:
-            comment = post.reply(message)
-        except (APIException, ClientException, PRAWException, PrawcoreException) as error:
-            logging.error("%s:%s: %s", identifier, requester, error)
-            logging.info("%s:%s: waiting %s seconds before retrying. Retry #: %s", identifier, requester, wait_time, tries)
-            time.sleep(wait_time)
-            wait_time = wait_time * config.backoff_multiplier
-            tries += 1
+    comment = retry.call(lambda: post.reply(message), identifier, requester)
 
     if comment:
         logging.info("%s:%s: Posted comment: \"%s\"", identifier, requester, utils.comment_permalink(comment))
@@ -160,30 +227,32 @@ def post_comment(post, message, identifier, requester):
         return False
 
 
-def edit_comment(comment, message, identifier, requester):
-    """ Edits comments.
+def edit_comment(comment, message, identifier, requester, tries=0):
+    """ Edits comments. Failed edits are retried later by a scheduled job instead of waiting in this thread.
         Parameters:
             comment:    [object] from praw
             message:    [string] comment to post
             identifier: [string] random 6 digit
             requester:  [string] redditor doing giveaway
-        Returns: True / False"""
-    tries = 0
-    edited_comment = None
-    wait_time = config.wait_time
-    message += config.footer_message
-
-    while not edited_comment and tries < config.retries:
-        try:
-            edited_comment = comment.edit(message)
-        except (APIException, ClientException, PRAWException, PrawcoreException) as error:
-            logging.error("%s:%s: %s", identifier, requester, error)
-            logging.info("%s:%s: waiting %s seconds before retrying. Retry #: %s", identifier, requester, wait_time, tries)
-            time.sleep(wait_time)
-            wait_time = wait_time * config.backoff_multiplier
-            tries += 1
-
-    if edited_comment:
+            tries:      [int] attempts already made
+        Returns: True / False, retry.DEFERRED if it failed and the next attempt was scheduled"""
+    # one pending retry per comment, an older message must not overwrite this one once its retry runs
+    job_id = '%s:%s:%s:EDIT_COMMENT' % (identifier, requester, comment.id)
+    if tries == 0 and utils.scheduler.get_job(job_id) is not None:
+        utils.scheduler.remove_job(job_id)
+
+    def defer(next_tries, run_date):
+        utils.scheduler.add_job(retry_edit_comment, 'date', run_date=run_date, id=job_id, replace_existing=True,
+                                args=[comment.id, message, identifier, requester, next_tries])
+
+    edited_comment = retry.call(lambda: comment.edit(message + config.footer_message), identifier, requester,
+                                tries=tries, defer=defer)
+
+    if edited_comment is retry.DEFERRED:
+        logging.info("%s:%s: Comment edit scheduled for retry: \"%s\"", identifier, requester,
+                     utils.comment_permalink(comment))
+        return retry.DEFERRED
+    elif edited_comment:
         logging.info("%s:%s: Edited comment: \"%s\"", identifier, requester, utils.comment_permalink(comment))
         return True
     else:
@@ -191,7 +260,12 @@ def edit_comment(comment, message, identifier, requester):
         return False
 
 
-def send_pm(recipient, subject, message, identifier, requester):
+def retry_edit_comment(comment_id, message, identifier, requester, tries):
+    """ Scheduled retry of edit_comment, only the comment id is stored with the job."""
+    edit_comment(get_comment(comment_id), message, identifier, requester, tries)
+
+
+def send_pm(recipient, subject, message, identifier, requester, defer=False, tries=0):
     """ Sends PMs
         Parameters:
             recipient:  [string] reddit username
@@ -199,167 +273,262 @@ def send_pm(recipient, subject, message, identifier, requester):
             message:    [string] pm body
             identifier: [string] random 6 digits
             requester:  [string] redditor doing giveaway
-        Returns: True / False"""
-    tries = 0
-    sent = None
-    wait_time = config.wait_time
-    message += config.footer_message
-
-    while not sent and tries < config.retries:
-        try:
-            sent = reddit.redditor(recipient).message(subject, message)
-        except (APIException, ClientException, PRAWException, PrawcoreException) as error:
-            logging.error("%s:%s: %s", identifier, requester, error)
-            logging.info("%s:%s: waiting %s seconds before retrying. Retry #: %s", identifier, requester, wait_time, tries)
-            time.sleep(wait_time)
-            wait_time = wait_time * config.backoff_multiplier
-            tries += 1
-
-    if sent:
+            defer:      [bool] retry failed sends later in a scheduled job instead of waiting in this thread
+            tries:      [int] attempts already made
+        Returns: True / False, retry.DEFERRED if it failed and the next attempt was scheduled (defer only)"""
+    def schedule_retry(next_tries, run_date):
+        utils.scheduler.add_job(send_pm, 'date', run_date=run_date,
+                                args=[recipient, subject, message, identifier, requester, True, next_tries])
+
+    # message() returns nothing on success
+    sent = retry.call(lambda: client().redditor(recipient).message(subject, message + config.footer_message) or True,
+                      identifier, requester, tries=tries, defer=schedule_retry if defer else None)
+
+    if sent is retry.DEFERRED:
+        logging.info("%s:%s: PM to %s scheduled for retry.", identifier, requester, recipient)
+        metrics.pms.inc(result='deferred')
+        return retry.DEFERRED
+    elif sent:
         logging.info("%s:%s: PM sent to: %s", identifier, requester, recipient)
+        metrics.pms.inc(result='sent')
         return True
     else:
         logging.error("%s:%s: Failed to send PM to: %s", identifier, requester, recipient)
+        metrics.pms.inc(result='failed')
         return False
 
 
+def _comment_entry(post_id):
+    """ Returns the comment store entry of a post, creating an empty one if needed."""
+    with comment_store_lock:
+        entry = comment_store.get(post_id)
+        if entry is None:
+            entry = {'lock': threading.Lock(),  # one harvest per post at a time
+                     'cursor': None,  # created_utc of the newest comment merged
+                     'cursor_ids': set(),  # ids of the comments merged at the cursor timestamp
+                     'comments': collections.OrderedDict()}  # first comment per author, oldest first
+            comment_store[post_id] = entry
+        return entry
+
+
+def forget_post(post_id):
+    """ Drops the stored comments of a post once its giveaway is over."""
+    with comment_store_lock:
+        comment_store.pop(post_id, None)
+
+
+def _record(item):
+    """ Returns: [CommentRecord] of a praw top level comment"""
+    body = item.body
+    found = re.search(r'\d+', body)
+    return CommentRecord(str(item.author), item.created_utc,
+                         body[:max(config.comment_body_prefix, config.comment_character_limit)], item.id,
+                         int(found.group(0)) if found is not None else None)
+
+
+def _new_comments(post, cursor):
+    """ Walks the top level comments of a post newest first, one page at a time, stopping once the cursor is reached.
+        Each page is turned into CommentRecords and dropped before the next one is loaded, replies and their
+        "load more" links are never fetched.
+        Parameters:
+            post:   [object] from praw, not fetched yet
+            cursor: [float] created_utc of the newest comment already stored, 0 for all comments
+        Returns: [list] of CommentRecord of the top level comments posted at or after the cursor"""
+    post.comment_sort = 'new'
+    fresh = []
+    more = collections.deque()  # every top level "load more" link, in the order reddit listed them
+    pending = list(post.comments)
+    while True:
+        for item in pending:
+            if isinstance(item, MoreComments):
+                if item.parent_id == post.fullname:
+                    more.append(item)
+            elif item.parent_id != post.fullname:
+                continue
+            elif item.created_utc < cursor:
+                if item.stickied:
+                    continue  # stickied comments (AutoModerator...) come first even when sorted by new
+                return fresh
+            else:
+                fresh.append(_record(item))
+        if not more:
+            break
+        # only load the next page of older comments when the cursor has not been reached yet
+        ratelimit.budget.acquire()
+        pending = more.popleft().comments()
+    return fresh
+
+
 def unique_users(requester, identifier, post_id):
     """ Gets a list of unique redditors and their comments (top level comments only), not including requester and bot
+        The first call for a post fetches every comment, later calls only fetch the comments posted since the
+        newest one already stored and merge them in.
         Parameters:
             requester:  [string] reddit username
             identifier: [string] random 6 digits
             post_id:    [string] post id
-        Returns: [list] of unique redditor usernames [string] and [dict] of unique comments with date as key
+        Returns: [OrderedDict] of unique redditor usernames [string] and their first comment [CommentRecord], oldest
+                 first
                     -1 if no comments found, False if error"""
     start = datetime.datetime.now()
-    redditors = []
-    comment_dict = {}
-    all_comments = collections.OrderedDict()
-
-    tries = 0
-    wait_time = config.wait_time
-
-    while not comment_dict and tries < config.retries:
-        try:
-            post = reddit.submission(id=post_id)
-            logging.info("%s:%s: Getting unique redditors and their comments for post: %s", identifier, requester,
-                     post.permalink)
-            # limit=None fetches all comments from a post (high comment posts will take a long time)
-            post.comments.replace_more(limit=None)
-            logging.info("%s:%s: Total top-level comments fetched: %s", identifier, requester, len(post.comments))
-            # If no users / comments found
-            if len(post.comments) == 0:
-                return -1
-            # Create dict with all comments and with date as key
-            comment_cnt = 0
-            for comment in post.comments:
-                author = str(comment.author).lower()
-                if author and author != 'none' and author != requester and author != auth.my_username:
-                    timestamp = comment.created_utc
-                    date = datetime.datetime.fromtimestamp(timestamp)
-                    comment_dict[date] = comment
-                    comment_cnt += 1
-                else:
-                    if author == 'none':
-                        logging.debug("%s:%s: Comment author is NONE (deleted comment)", identifier, requester)
-                    else:
-                        logging.debug("%s:%s: Skipping comment from bot or giveaway requester: %s", identifier, requester,
-                                  author)
-
-        except (APIException, ClientException, PRAWException, PrawcoreException) as error:
-            logging.error("%s:%s: %s", identifier, requester, error)
-            logging.info("%s:%s: waiting %s seconds before retrying. Retry #: %s", identifier, requester, wait_time, tries)
-            time.sleep(wait_time)
-            wait_time = wait_time * config.backoff_multiplier
-            tries += 1
-            comment_dict = {}
-
-    if comment_dict:
-        logging.info("%s:%s: Sorting by date and removing extra comments...", identifier, requester)
+    entry = _comment_entry(post_id)
+
+    def fetch():
+        post = client().submission(id=post_id)
+        if entry['cursor'] is None:
+            logging.info("%s:%s: Getting unique redditors and their comments for post: %s", identifier,
+                         requester, post.permalink)
+            # every page of the post (high comment posts will take a long time)
+            return _new_comments(post, 0)
+        logging.info("%s:%s: Getting comments newer than %s for post: %s", identifier, requester,
+                     datetime.datetime.fromtimestamp(entry['cursor']), post_id)
+        return _new_comments(post, entry['cursor'])
+
+    with entry['lock'], tracing.span(identifier, tracing.HARVEST):
+        fetched = retry.call(fetch, identifier, requester)
+        if fetched is not None:
+            logging.info("%s:%s: Total top-level comments fetched: %s", identifier, requester, len(fetched))
+            metrics.comments_harvested.inc(len(fetched))
+
+        if fetched is None:
+            logging.error("%s:%s: Failed to get unique redditors.", identifier, requester)
+            return False
 
-        # Sort comments by date, keep only first comment per redditor in ordered dict
-        for key in sorted(comment_dict):
-            comment = comment_dict[key]
-            author = str(comment.author).lower()
-            comment_date = datetime.datetime.fromtimestamp(comment.created_utc)
-            logging.debug("%s:%s: Comment: %s - %s", identifier, requester, comment_date, author)
-            if author not in redditors:
-                redditors.append(author)
-                all_comments[author] = comment
+        logging.info("%s:%s: Sorting by date and removing extra comments...", identifier, requester)
+        all_comments = entry['comments']
+        # Sort comments by date, keep only first comment per redditor
+        fetched.sort(key=operator.itemgetter(1))
+        for comment in fetched:
+            if comment.created_utc == entry['cursor'] and comment.id in entry['cursor_ids']:
+                continue  # already merged by a previous call
+            if comment.created_utc != entry['cursor']:
+                entry['cursor'] = comment.created_utc
+                entry['cursor_ids'] = set()
+            entry['cursor_ids'].add(comment.id)
+
+            author = comment.author.lower()
+            if author == 'none':
+                logging.debug("%s:%s: Comment author is NONE (deleted comment)", identifier, requester)
+            elif author == requester or author == auth.my_username:
+                logging.debug("%s:%s: Skipping comment from bot or giveaway requester: %s", identifier, requester,
+                              author)
+            elif author in all_comments:
+                logging.debug("%s:%s: Skipping extra comment from user: %s.", identifier, requester, author)
             else:
-                logging.debug("%s:%s: Deleting extra comment from user: %s.", identifier, requester, author)
-                del comment_dict[key]
+                logging.debug("%s:%s: Comment: %s - %s", identifier, requester,
+                              datetime.datetime.fromtimestamp(comment.created_utc), author)
+                all_comments[author] = comment
+
+        if not all_comments:
+            return -1
 
-        logging.info("%s:%s: Total comments kept: %s", identifier, requester, len(comment_dict))
+        logging.info("%s:%s: Total comments kept: %s", identifier, requester, len(all_comments))
         logging.info("%s:%s: Completed, OK - processing time: %s", identifier, requester, (datetime.datetime.now() - start))
-        return all_comments
-    else:
-        logging.error("%s:%s: Failed to get unique redditors.", identifier, requester)
-        return False
+        # callers remove entries while drawing, hand them a copy of the stored index
+        return collections.OrderedDict(all_comments)
 
 
 def check_account(redditor, pkarma, ckarma, days, identifier, requester):
     """ Checks whether redditor account meets requirements for giveaway.
         Parameters:
-            redditor:   [object] reddit user
+            redditor:   [string] reddit username
             pkarma:     [int] minimum post karma
             ckarma:     [int] minimum comment karma
             days:       [int] minimum account age
             requester:  [string] redditor doing giveaway
             identifier: [string] unique 6 digit
-        Returns: True / False"""
+        Returns: True / False, None if the account could not be fetched"""
     pkarma_ok = True
     ckarma_ok = True
     days_ok = True
     username = str(redditor)
 
-    checked = False
-    tries = 0
-    wait_time = config.wait_time
-
     #logging.info("%s:%s: Account check for: %s", identifier, requester, username)
 
-    while not checked and tries < config.retries:
-        try:
-            if pkarma > 0:
-                redditor_pkarma = redditor.link_karma
-                if redditor_pkarma > pkarma:
-                    pkarma_ok = True
-                else:
-                    pkarma_ok = False
-            if ckarma > 0:
-                redditor_ckarma = redditor.comment_karma
-                if redditor_ckarma > ckarma:
-                    ckarma_ok = True
-                else:
-                    ckarma_ok = False
-            if days > 0:
-                redditor_created = redditor.created_utc
-                date_created = datetime.datetime.fromtimestamp(redditor_created)
-                temp = datetime.datetime.now() - date_created
-                redditor_age = temp.days
-                if redditor_age > days:
-                    days_ok = True
-                else:
-                    days_ok = False
-            if pkarma_ok and ckarma_ok and days_ok:
-                logging.info("%s:%s: OK, account requirements met: %s", identifier, requester, username)
-                checked = True
-                return True
-            else:
-                logging.info("%s:%s: FAIL, account requirements not met: %s",
-                         identifier, requester, username)
-                checked = True
-                return False
-
-        except (APIException, ClientException, PRAWException, PrawcoreException) as error:
-            logging.error("%s:%s: %s", identifier, requester, error)
-            logging.info("%s:%s: waiting %s seconds before retrying. Retry #: %s", identifier, requester, wait_time, tries)
-            time.sleep(wait_time)
-            wait_time = wait_time * config.backoff_multiplier
-            tries += 1
-
-    if checked:
-        logging.info("%s:%s: Account check processed OK for: %s", identifier, requester, username)
-    else:
+    def fetch():
+        # a single fetch loads all three values, cache them together
+        account = client().redditor(username)
+        fetched = (account.link_karma, account.comment_karma, account.created_utc)
+        profiles().put(username.lower(), *fetched)
+        return fetched
+
+    profile = profiles().get(username.lower())
+    if profile is None:
+        profile = retry.call(fetch, identifier, requester)
+    if profile is None:
         logging.error("%s:%s: Something occurred during account check for: %s", identifier, requester, username)
+        return None
+
+    redditor_pkarma, redditor_ckarma, redditor_created = profile
+    if pkarma > 0:
+        if redditor_pkarma > pkarma:
+            pkarma_ok = True
+        else:
+            pkarma_ok = False
+    if ckarma > 0:
+        if redditor_ckarma > ckarma:
+            ckarma_ok = True
+        else:
+            ckarma_ok = False
+    if days > 0:
+        date_created = datetime.datetime.fromtimestamp(redditor_created)
+        temp = datetime.datetime.now() - date_created
+        redditor_age = temp.days
+        if redditor_age > days:
+            days_ok = True
+        else:
+            days_ok = False
+    if pkarma_ok and ckarma_ok and days_ok:
+        logging.info("%s:%s: OK, account requirements met: %s", identifier, requester, username)
+        return True
+    else:
+        logging.info("%s:%s: FAIL, account requirements not met: %s",
+                 identifier, requester, username)
+        return False
+
+
+def check_accounts(redditors, needed, pkarma, ckarma, days, identifier, requester):
+    """ Checks redditor accounts in parallel, in draw order, until enough of them meet the requirements.
+        At most config.account_check_workers accounts are fetched at the same time, checks still queued once enough
+        valid accounts are found are cancelled.
+        Parameters:
+            redditors:  [iterable] of reddit usernames [string] in draw order
+            needed:     [int] number of valid accounts wanted
+            pkarma:     [int] minimum post karma
+            ckarma:     [int] minimum comment karma
+            days:       [int] minimum account age
+            identifier: [string] unique 6 digit
+            requester:  [string] redditor doing giveaway
+        Returns: [list] of valid reddit usernames [string] in draw order, shorter than needed if candidates ran out
+                    None if an account check failed"""
+    valid = []
+    candidates = iter(redditors)
+    pending = collections.deque()
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=config.account_check_workers)
+    checks = tracing.span(identifier, tracing.ELIGIBILITY)
+
+    def submit_next():
+        redditor = next(candidates, None)
+        if redditor is not None:
+            # account checks wait for the API budget at the caller's priority
+            pending.append((redditor, executor.submit(contextvars.copy_context().run, check_account, redditor,
+                                                      pkarma, ckarma, days, identifier, requester)))
+
+    try:
+        for _ in range(config.account_check_workers):
+            submit_next()
+        # results are consumed in draw order so a slow early candidate is never skipped for a faster later one
+        while pending and len(valid) < needed:
+            redditor, future = pending.popleft()
+            result = future.result()
+            if result is None:
+                logging.error("%s:%s: Account check failed for: %s", identifier, requester, redditor)
+                return None
+            if result:
+                valid.append(redditor)
+            submit_next()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        checks.stop()
+    logging.info("%s:%s: Profile cache: %s", identifier, requester, profiles().stats())
+    return valid
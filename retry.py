@@ -0,0 +1,94 @@
+import datetime
+import logging
+import random
+import re
+import time
+
+from prawcore.exceptions import PrawcoreException
+from praw.exceptions import APIException, ClientException, PRAWException
+import config
+import metrics
+import ratelimit
+
+api_errors = (APIException, ClientException, PRAWException, PrawcoreException)
+DEFERRED = 'deferred'  # returned by call() when the next attempt was handed to the scheduler
+
+
+def budget_wait(error):
+    """ Returns: [float] seconds reddit asked every request of the account to wait (429 / x-ratelimit headers), 0 if
+                 it did not say"""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    try:
+        if 'retry-after' in headers:
+            return float(headers['retry-after'])
+        if 'x-ratelimit-remaining' in headers and float(headers['x-ratelimit-remaining']) < 1:
+            return float(headers.get('x-ratelimit-reset', 0))
+    except ValueError:
+        pass
+    return 0
+
+
+def rate_limit_wait(error):
+    """ Returns: [float] seconds reddit asked to wait before the next request, 0 if it did not say.
+                 Includes the RATELIMIT of a single action (commenting, PMing too often), see budget_wait()"""
+    wait = budget_wait(error)
+    if wait:
+        return wait
+    if isinstance(error, APIException) and error.error_type == 'RATELIMIT':
+        # e.g. "you are doing that too much. try again in 9 minutes."
+        found = re.search(r'(\d+) (minute|second)', str(error.message))
+        if found:
+            wait = int(found.group(1))
+            return wait * 60 if found.group(2) == 'minute' else wait
+    return 0
+
+
+def wait_time(tries, error=None):
+    """ Returns: [float] seconds to wait before retry #tries, exponential backoff with jitter but never shorter than
+                 what reddit asked for"""
+    wait = max(config.wait_time * config.backoff_multiplier ** tries, rate_limit_wait(error))
+    return wait + random.uniform(0, config.wait_jitter)
+
+
+def call(action, identifier, requester, tries=0, retries=None, defer=None):
+    """ Runs an API call, retrying on reddit/connection errors. Each attempt waits for the shared API budget first.
+        Parameters:
+            action:     [function] without arguments making the API call(s), returns the result
+            identifier: [string] unique 6 digit
+            requester:  [string] redditor doing giveaway
+            tries:      [int] attempts already made
+            retries:    [int] maximum number of attempts, config.retries by default
+            defer:      [function] taking (tries, run_date), when given failed attempts are not retried in this thread,
+                        defer is called to schedule the next attempt instead
+        Returns: result of action, DEFERRED if the next attempt was scheduled, None if all attempts failed"""
+    if retries is None:
+        retries = config.retries
+    while tries < retries:
+        ratelimit.budget.acquire()
+        try:
+            return action()
+        except api_errors as error:
+            wait = wait_time(tries, error)
+            tries += 1
+            logging.error("%s:%s: %s", identifier, requester, error)
+            metrics.api_retries.inc(error=type(error).__name__)
+            if rate_limit_wait(error):
+                metrics.api_rate_limited.inc()
+            if budget_wait(error):  # an action RATELIMIT only delays this call, through wait
+                ratelimit.budget.pause(budget_wait(error))
+            if tries >= retries:
+                break
+            if defer:
+                logging.info("%s:%s: retrying in %.0f seconds as a scheduled job. Retry #: %s", identifier, requester,
+                             wait, tries)
+                defer(tries, datetime.datetime.now() + datetime.timedelta(seconds=wait))
+                return DEFERRED
+            if wait > config.max_wait_time:
+                logging.error("%s:%s: reddit asked to wait %.0f seconds, not retrying.", identifier, requester, wait)
+                break
+            logging.info("%s:%s: waiting %.0f seconds before retrying. Retry #: %s", identifier, requester, wait, tries)
+            time.sleep(wait)
+        finally:
+            ratelimit.update()
+    return None
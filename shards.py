@@ -0,0 +1,37 @@
+import logging
+import os
+import subprocess
+import sys
+import zlib
+
+import config
+
+# sharded mode, config.shards worker processes each run the draws and number updates of their share of the
+# giveaways with their own reddit session; shard 0 also handles the inbox, post setup, logs and the other workers
+current = int(os.environ.get('AUTOGIVEAWAY_SHARD', 0))
+
+
+def owner(identifier):
+    """ Returns: [int] shard running the draw and number updates of a giveaway"""
+    return zlib.crc32(str(identifier).encode()) % config.shards
+
+
+def is_local(identifier):
+    """ Returns: True if this process is the shard owning the giveaway"""
+    return owner(identifier) == current
+
+
+def jobs_table():
+    """ Returns: [string] scheduler jobstore table of this shard, shard 0 keeps the original table"""
+    return 'apscheduler_jobs' if current == 0 else 'apscheduler_jobs_shard%s' % current
+
+
+def spawn():
+    """ Starts the worker processes of the other shards, run by shard 0.
+        Returns: [list] of subprocess.Popen"""
+    workers = []
+    for shard in range(1, config.shards):
+        logging.info("Starting shard %s worker...", shard)
+        workers.append(subprocess.Popen([sys.executable] + sys.argv,
+                                        env=dict(os.environ, AUTOGIVEAWAY_SHARD=str(shard))))
+    return workers
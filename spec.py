@@ -0,0 +1,65 @@
+import datetime
+
+
+class GiveawayArgs(object):
+    """ Parsed giveaway settings, built by utils.parse_pm and passed through setup, schedule and process.
+        Parameters:
+            giveaway_type:  [string] random / number / keyword
+            date:           [datetime] when to run the giveaway
+            guessnum:       [int] number to guess (number giveaway)
+            minnum:         [int] min number (number giveaway)
+            maxnum:         [int] max number (number giveaway)
+            keyword:        [string] keyword (keyword giveaway)
+            winners:        [int] number of possible winners
+            is_mention:     [bool] giveaway started by a user mention
+            pkarma:         [int] minimum post karma of winners
+            ckarma:         [int] minimum comment karma of winners
+            days:           [int] minimum account age of winners
+            codes:          [string] codes as sent in the PM, cleared once parsed by utils.parse_codes"""
+
+    __slots__ = ('giveaway_type', 'date', 'guessnum', 'minnum', 'maxnum', 'keyword', 'winners', 'is_mention',
+                 'pkarma', 'ckarma', 'days', 'codes')
+
+    def __init__(self, giveaway_type, date, guessnum=None, minnum=None, maxnum=None, keyword=None, winners=1,
+                 is_mention=False, pkarma=0, ckarma=0, days=0, codes=None):
+        self.giveaway_type = giveaway_type
+        self.date = date
+        self.guessnum = guessnum
+        self.minnum = minnum
+        self.maxnum = maxnum
+        self.keyword = keyword
+        self.winners = winners
+        self.is_mention = is_mention
+        self.pkarma = pkarma
+        self.ckarma = ckarma
+        self.days = days
+        self.codes = codes
+
+    def __repr__(self):
+        # codes are left out, they end up in the logs
+        return 'GiveawayArgs(%s)' % ', '.join('%s=%r' % (x, getattr(self, x)) for x in self.__slots__[:-1])
+
+    def check_accounts(self):
+        """ Returns: True if winner accounts have karma or age requirements"""
+        return self.pkarma > 0 or self.ckarma > 0 or self.days > 0
+
+    def to_dict(self):
+        """ Returns: [dict] of the settings, JSON serializable, the date in ISO 8601"""
+        settings = dict((x, getattr(self, x)) for x in self.__slots__)
+        settings['date'] = self.date.isoformat()
+        return settings
+
+    @classmethod
+    def from_dict(cls, settings):
+        """ Builds the settings back from to_dict()."""
+        settings = dict(settings)
+        settings['date'] = datetime.datetime.fromisoformat(settings['date'])
+        return cls(**settings)
+
+    @classmethod
+    def from_list(cls, giveaway_args):
+        """ Builds the settings from the positional giveaway_args lists used by older scheduled jobs:
+            [type, date, guessnum, minnum, maxnum, keyword, winners, is_mention, pkarma, ckarma, days(, codes)]"""
+        if isinstance(giveaway_args, cls):
+            return giveaway_args
+        return cls(*giveaway_args[:11])
@@ -0,0 +1,133 @@
+import datetime
+import json
+import time
+
+import database
+import shards
+from spec import GiveawayArgs
+
+# giveaway state, scheduler jobs only carry the identifier and load the rest from here
+_columns = ('requester', 'args', 'codes', 'post_id', 'comment_id', 'numbers_comment_id')
+
+
+def _setup():
+    database.setup('giveaways', [
+        'CREATE TABLE IF NOT EXISTS giveaways ('
+        'identifier TEXT PRIMARY KEY, requester TEXT, args TEXT, codes TEXT, post_id TEXT, comment_id TEXT, '
+        'numbers_comment_id TEXT, created REAL)'])
+    # status: 'setup' while looking for the post, 'scheduling' once found while its comment is posted, 'ready' once
+    # its jobs can start, 'claimed' once a shard started them
+    database.add_columns('giveaways', ['shard INTEGER', 'status TEXT', 'claimed_by INTEGER', 'claimed REAL',
+                                       'scheduling REAL'])
+
+
+def _load_args(args):
+    giveaway_args = json.loads(args)
+    if isinstance(giveaway_args, list):  # rows saved as positional lists before GiveawayArgs
+        giveaway_args[1] = datetime.datetime.fromisoformat(giveaway_args[1])
+        return GiveawayArgs.from_list(giveaway_args)
+    return GiveawayArgs.from_dict(giveaway_args)
+
+
+def save(identifier, requester, giveaway_args, codes, post_id=None, comment_id=None):
+    """ Saves a new giveaway.
+        Parameters:
+            identifier:     [string] unique 6 digit
+            requester:      [string] reddit username
+            giveaway_args:  [object] GiveawayArgs of parsed giveaway arguments
+            codes:          [list] parsed giveaway codes, None for mentions
+            post_id:        [string] giveaway post id, once known
+            comment_id:     [string] bot comment id (mention comment for mentions), once known"""
+    _setup()
+    database.execute('INSERT OR REPLACE INTO giveaways (identifier, requester, args, codes, post_id, comment_id, '
+                     'numbers_comment_id, created, shard, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                     (identifier, requester, json.dumps(giveaway_args.to_dict()), json.dumps(codes), post_id,
+                      comment_id, None, time.time(), shards.owner(identifier), 'ready' if post_id else 'setup'))
+
+
+def update(identifier, **fields):
+    """ Updates post_id, comment_id, numbers_comment_id and/or status of a giveaway."""
+    _setup()
+    names = sorted(fields)
+    database.execute('UPDATE giveaways SET %s WHERE identifier = ?' % ', '.join('%s = ?' % x for x in names),
+                     tuple(fields[x] for x in names) + (identifier,))
+
+
+def load(identifier):
+    """ Returns: [dict] with requester, giveaway_args, codes, post_id, comment_id and numbers_comment_id
+                 None if the giveaway is not stored"""
+    _setup()
+    rows = database.execute('SELECT %s FROM giveaways WHERE identifier = ?' % ', '.join(_columns), (identifier,))
+    if not rows:
+        return None
+    giveaway = dict(zip(_columns, rows[0]))
+    giveaway['giveaway_args'] = _load_args(giveaway.pop('args'))
+    giveaway['codes'] = json.loads(giveaway['codes'])
+    return giveaway
+
+
+def pending():
+    """ Returns: [list] of (identifier, requester, created) of the giveaways still looking for their post"""
+    _setup()
+    return database.execute("SELECT identifier, requester, created FROM giveaways WHERE status = 'setup' "
+                            "ORDER BY created")
+
+
+def claim(identifier, shard):
+    """ Marks a ready giveaway as started by shard.
+        Returns: True if shard claimed it, False if it is not ready or was claimed already"""
+    _setup()
+    with database.transaction(immediate=True) as db:
+        return db.execute("UPDATE giveaways SET status = 'claimed', claimed_by = ?, claimed = ? "
+                          "WHERE identifier = ? AND status = 'ready'", (shard, time.time(), identifier)).rowcount == 1
+
+
+def start_scheduling(identifier):
+    """ Marks a giveaway whose post was found as being scheduled, it is no longer pending.
+        Returns: True if it was still looking for its post, False if another pass is scheduling it already"""
+    _setup()
+    with database.transaction(immediate=True) as db:
+        return db.execute("UPDATE giveaways SET status = 'scheduling', scheduling = ? WHERE identifier = ? AND "
+                          "status = 'setup'", (time.time(), identifier)).rowcount == 1
+
+
+def stop_scheduling(identifier):
+    """ Puts a giveaway whose scheduling failed back to looking for its post, unless its comment was posted.
+        Returns: True if it is looking for its post again"""
+    _setup()
+    with database.transaction(immediate=True) as db:
+        return db.execute("UPDATE giveaways SET status = 'setup' WHERE identifier = ? AND status = 'scheduling' AND "
+                          "comment_id IS NULL", (identifier,)).rowcount == 1
+
+
+def status(identifier):
+    """ Returns: [string] status of a giveaway, None if it is not stored"""
+    _setup()
+    rows = database.execute('SELECT status FROM giveaways WHERE identifier = ?', (identifier,))
+    return rows[0][0] if rows else None
+
+
+def stuck(timeout):
+    """ Returns: [list] of (identifier, requester) of the giveaways still being scheduled timeout seconds after it
+                 started, their process stopped or failed midway"""
+    _setup()
+    return database.execute("SELECT identifier, requester FROM giveaways WHERE status = 'scheduling' AND "
+                            "(scheduling IS NULL OR scheduling < ?)", (time.time() - timeout,))
+
+
+def claim_ready(shard):
+    """ Claims all ready giveaways owned by shard.
+        Returns: [list] of claimed identifiers"""
+    _setup()
+    with database.transaction(immediate=True) as db:
+        identifiers = [row[0] for row in db.execute("SELECT identifier FROM giveaways WHERE shard = ? AND "
+                                                    "status = 'ready'", (shard,))]
+        db.executemany("UPDATE giveaways SET status = 'claimed', claimed_by = ?, claimed = ? WHERE identifier = ?",
+                       [(shard, time.time(), identifier) for identifier in identifiers])
+    return identifiers
+
+
+def delete(identifier):
+    """ Removes a giveaway that has ended or expired."""
+    _setup()
+    database.execute('DELETE FROM giveaways WHERE identifier = ?', (identifier,))
@@ -0,0 +1,146 @@
+import logging
+import sqlite3
+import sys
+import threading
+import time
+
+import config
+import database
+
+# timing of every giveaway lifecycle stage, keyed by identifier, kept in the spans table of config.database
+PARSE = 'parse'  # PM / mention parsing, recorded under the message id until rekey() gives it the identifier
+SETUP_PM = 'setup_pm'
+DISCOVERY = 'discovery'  # recent posts fetch and identifier match, per DISCOVER_POSTS run
+SCHEDULE_COMMENT = 'schedule_comment'
+NUMBER_REFRESH = 'number_refresh'
+HARVEST = 'harvest'  # unique_users
+ELIGIBILITY = 'eligibility'  # account checks of the winners
+DRAW = 'draw'  # random_winner / pick_winner, harvest and eligibility included
+PM_FANOUT = 'pm_fanout'
+COMMENT_EDIT = 'comment_edit'
+
+_pending = []  # spans not written yet: (identifier, stage, started, duration, failed)
+_lock = threading.Lock()
+_flushed = time.monotonic()
+_pruned = 0
+
+
+def _setup():
+    # clustered by identifier, the spans of a giveaway are stored next to each other
+    database.setup('spans', [
+        'CREATE TABLE IF NOT EXISTS spans ('
+        'identifier TEXT, stage TEXT, started REAL, duration REAL, failed INTEGER, '
+        'PRIMARY KEY (identifier, started, stage)) WITHOUT ROWID',
+        'CREATE INDEX IF NOT EXISTS spans_stage ON spans (stage, started)'])
+
+
+def record(identifier, stage, started, duration, failed=False):
+    """ Stores a span measured by the caller.
+        Parameters:
+            identifier: [string] unique 6 digit (message id before one is assigned)
+            stage:      [string] lifecycle stage, one of the constants above
+            started:    [float] unix time the stage started
+            duration:   [float] (in seconds) time the stage took
+            failed:     [bool] the stage failed"""
+    if not config.trace_spans:
+        return
+    with _lock:
+        _pending.append((str(identifier), stage, started, duration, int(failed)))
+        due = len(_pending) >= config.trace_flush_size or \
+            time.monotonic() - _flushed >= config.trace_flush_interval
+    if due:
+        flush()
+
+
+class Span(object):
+    """ Running stage of a giveaway, recorded by stop() or at the end of its with block (failed if it raises)."""
+
+    def __init__(self, identifier, stage):
+        self.identifier = identifier
+        self.stage = stage
+        self.started = time.time()
+        self._start = time.perf_counter()
+
+    def stop(self, failed=False, identifiers=None):
+        """ Records the span, under each of identifiers instead when the stage served several giveaways."""
+        duration = time.perf_counter() - self._start
+        for identifier in identifiers or [self.identifier]:
+            record(identifier, self.stage, self.started, duration, failed)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, kind, value, traceback):
+        self.stop(kind is not None)
+
+
+def span(identifier, stage):
+    """ Returns: [object] Span timing stage of giveaway identifier from now"""
+    return Span(identifier, stage)
+
+
+def flush():
+    """ Writes the buffered spans, spans older than config.trace_retention days are dropped once an hour."""
+    global _flushed, _pruned
+    with _lock:
+        rows = list(_pending)
+        del _pending[:]
+        _flushed = time.monotonic()
+    if not rows:
+        return
+    _setup()
+    try:
+        database.executemany('INSERT OR REPLACE INTO spans (identifier, stage, started, duration, failed) '
+                             'VALUES (?, ?, ?, ?, ?)', rows)
+        if time.time() - _pruned > 3600:
+            _pruned = time.time()
+            database.execute('DELETE FROM spans WHERE started < ?', (time.time() - config.trace_retention * 86400,))
+    except sqlite3.Error as error:
+        logging.error("Failed to store %s spans: %s", len(rows), error)
+
+
+def rekey(old, new):
+    """ Moves the spans recorded under old (the message id) to giveaway identifier new."""
+    if not config.trace_spans:
+        return
+    with _lock:
+        _pending[:] = [(new,) + row[1:] if row[0] == old else row for row in _pending]
+    _setup()
+    database.execute('UPDATE spans SET identifier = ? WHERE identifier = ?', (new, old))
+
+
+def spans(identifier):
+    """ Returns: [list] of (stage, started, duration, failed) of a giveaway, in the order they started"""
+    flush()
+    _setup()
+    return database.execute('SELECT stage, started, duration, failed FROM spans WHERE identifier = ? '
+                            'ORDER BY started', (str(identifier),))
+
+
+def summary(since=0):
+    """ Returns: [list] of (stage, count, total, average, max) seconds per stage of the spans started after since
+                 (unix time), the stage taking the most time first"""
+    flush()
+    _setup()
+    return database.execute('SELECT stage, COUNT(*), SUM(duration), AVG(duration), MAX(duration) FROM spans '
+                            'WHERE started >= ? GROUP BY stage ORDER BY SUM(duration) DESC', (since,))
+
+
+def slowest(stage, limit=10):
+    """ Returns: [list] of (identifier, started, duration) of the slowest spans of a stage"""
+    flush()
+    _setup()
+    return database.execute('SELECT identifier, started, duration FROM spans WHERE stage = ? '
+                            'ORDER BY duration DESC LIMIT ?', (stage, limit))
+
+
+if __name__ == '__main__':
+    # python tracing.py [identifier]: the stages of one giveaway, or the totals per stage
+    if len(sys.argv) > 1:
+        for stage, started, duration, failed in spans(sys.argv[1]):
+            print('%s  %-16s %10.3f s%s' % (time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(started)), stage,
+                                            duration, '  FAILED' if failed else ''))
+    else:
+        print('%-16s %8s %12s %10s %10s' % ('stage', 'count', 'total s', 'avg s', 'max s'))
+        for row in summary():
+            print('%-16s %8s %12.3f %10.3f %10.3f' % row)
@@ -0,0 +1,77 @@
+import bisect
+
+
+class UsedNumbers(object):
+    """ Numbers already used in a number giveaway, kept as sorted non-overlapping ranges.
+        Fed with the comments harvested since the previous update only, so each update costs the new comments
+        instead of a full re-scan.
+        Parameters:
+            min_num:    [int] smallest valid number
+            max_num:    [int] biggest valid number"""
+
+    __slots__ = ('min_num', 'max_num', 'starts', 'ends', 'count', 'ingested', 'published', 'published_at')
+
+    def __init__(self, min_num, max_num):
+        self.min_num = min_num
+        self.max_num = max_num
+        self.starts = []  # first number of each range
+        self.ends = []  # last number of each range
+        self.count = 0  # total numbers used
+        self.ingested = 0  # entries of the comment index already read
+        self.published = None  # count at the last publication
+        self.published_at = None  # [datetime] of the last publication
+
+    def add(self, number):
+        """ Marks a number as used.
+            Returns: True if the number was not used yet, False otherwise"""
+        index = bisect.bisect_right(self.starts, number) - 1
+        if index >= 0 and number <= self.ends[index]:
+            return False
+        joins_left = index >= 0 and self.ends[index] == number - 1
+        joins_right = index + 1 < len(self.starts) and self.starts[index + 1] == number + 1
+        if joins_left and joins_right:
+            self.ends[index] = self.ends[index + 1]
+            del self.starts[index + 1]
+            del self.ends[index + 1]
+        elif joins_left:
+            self.ends[index] = number
+        elif joins_right:
+            self.starts[index + 1] = number
+        else:
+            self.starts.insert(index + 1, number)
+            self.ends.insert(index + 1, number)
+        self.count += 1
+        return True
+
+    def ranges(self):
+        """ Returns: [list] of (first, last) tuples of used numbers, in order"""
+        return list(zip(self.starts, self.ends))
+
+    def free_ranges(self):
+        """ Returns: [list] of (first, last) tuples of numbers between min_num and max_num not used yet, in order"""
+        free = []
+        first = self.min_num
+        for start, end in zip(self.starts, self.ends):
+            if start > first:
+                free.append((first, start - 1))
+            first = end + 1
+        if first <= self.max_num:
+            free.append((first, self.max_num))
+        return free
+
+    def changed(self):
+        """ Returns: True if numbers were added since the last publication"""
+        return self.count != self.published
+
+    def mark_published(self, date):
+        """ Records that the current numbers were published at date."""
+        self.published = self.count
+        self.published_at = date
+
+    def __iter__(self):
+        for start, end in zip(self.starts, self.ends):
+            for number in range(start, end + 1):
+                yield number
+
+    def __len__(self):
+        return self.count
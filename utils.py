@@ -1,4 +1,6 @@
 import logging
+import bisect
+import itertools
 import random
 import re
 import collections
@@ -6,27 +8,45 @@ import datetime
 import os
 import glob
 
-import dateparser
 from apscheduler.schedulers.blocking import BlockingScheduler
 from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
 from pytz import utc
 from pastebin import PastebinAPI
+from tracker import UsedNumbers
+from spec import GiveawayArgs
 import config
+import dates
+import outbox
+import pools
 import reddit
+import retry
+import shards
 import auth
 
 # global scheduler
 # noinspection PyRedeclaration
 jobstores = {
-    'default': SQLAlchemyJobStore(url='sqlite:///giveaways.sqlite')
+    # each shard has its own jobs table, see config.shards
+    'default': SQLAlchemyJobStore(url='sqlite:///' + config.database, tablename=shards.jobs_table(),
+                                  engine_options={'connect_args': {'timeout': config.database_timeout}})
 }
 job_defaults = {
     'coalesce': True,
+    'misfire_grace_time': config.misfire_grace_time,  # jobs waiting for a busy pool still run once it frees up
     # 'max_instances': 3
 }
 
-scheduler = BlockingScheduler(jobstores=jobstores, job_defaults=job_defaults, timezone=utc)
-pastebin = PastebinAPI()
+if config.runtime == 'asyncio':
+    from apscheduler.schedulers.asyncio import AsyncIOScheduler
+    # coroutine jobs run on the event loop, the others in the loop's thread pool
+    scheduler = AsyncIOScheduler(jobstores=jobstores, executors=pools.executors(config.runtime),
+                                 job_defaults=job_defaults, timezone=utc)
+else:
+    scheduler = BlockingScheduler(jobstores=jobstores, executors=pools.executors(config.runtime),
+                                  job_defaults=job_defaults, timezone=utc)
+pastebin = None  # PastebinAPI, created on first use by pastebin_api()
+# used numbers of running number giveaways, identifier -> UsedNumbers
+used_numbers = {}
 
 
 def giveaway_codes(requester, identifier, winner, codes, post):
@@ -41,7 +61,6 @@ def giveaway_codes(requester, identifier, winner, codes, post):
     logging.info("%s:%s: Distributing codes to winners...", identifier, requester)
 
     pms_to_send = []
-    failed_pms = []
 
     if len(winner) > 1:  # if multiple winners
         sorted_codes = []
@@ -126,79 +145,36 @@ def giveaway_codes(requester, identifier, winner, codes, post):
 
         winners = redditor
 
-    # Send pms out
+    # Send pms out, the outbox sends them in parallel and keeps retrying failed ones
     logging.info("%s:%s: Sending all PMs...", identifier, requester)
-    for pm in pms_to_send:
-        pm_redditor = pm[0]
-        pm_subject = pm[1]
-        pm_message = pm[2]
-        pm_identifier = pm[3]
-
-        sent = reddit.send_pm(pm_redditor, pm_subject, pm_message, pm_identifier, requester)
-
-        if sent:
-            #logging.info("%s:%s: PM sent to: %s", identifier, requester, pm_redditor)
-            continue
-        else:
-            logging.error("%s:%s: Failed to send PM to: %s, add to retry list.", identifier, requester, pm_redditor)
-            failed_pms.append(pm)
-
-    # if pms failed, create job to retry to send them later
-    if failed_pms:
-        date = datetime.datetime.now() + datetime.timedelta(minutes=config.retry_failed_pms_wait_time)
-        job_id = '%s:%s:FAILED_PM_RETRY' % (identifier, requester)
-        scheduler.add_job(retry_failed_pms, 'date', run_date=date, id=job_id,
-                          args=[requester, identifier, failed_pms, 1])
-        logging.error("%s:%s: Failed to send some PMs, scheduled retry job.", identifier, requester)
+    outbox.enqueue(requester, identifier, pms_to_send)
+    drain_outbox()
+    logging.info("%s:%s: PM status: %s", identifier, requester, outbox.summary(identifier))
 
     logging.info("%s:%s: Completed, OK", identifier, requester)
     return winners
 
 
 def retry_failed_pms(requester, identifier, failed_pms, retry):
-    """ Retries sending PMs
+    """ Retries sending PMs. Kept for retry jobs scheduled before PMs went through the outbox, the PMs are moved to
+        the outbox.
             Parameters:
                 requester:  [string] reddit username
                 identifier: [string] unique 6 digit
                 failed_pms: [list] of PMs to send [list]
                 retry:      [int] number of times retried
             Returns: nothing"""
-    logging.info("%s:%s: Retrying to send failed PMs for completed giveaway...", identifier, requester)
-    more_failed_pms = []
-    for pm in failed_pms:
-        pm_redditor = pm[0]
-        pm_subject = pm[1]
-        pm_message = pm[2]
-        pm_identifier = pm[3]
-
-        sent = reddit.send_pm(pm_redditor, pm_subject, pm_message, pm_identifier, requester)
-
-        if sent:
-            #logging.info("%s:%s: Retry: %s -- PM sent to: %s", identifier, requester, retry, pm_redditor)
-            continue
-        else:
-            logging.error("%s:%s: Retry: %s -- PM Failed to be sent to: %s, add to retry list.",
-                      identifier, requester, retry, pm_redditor)
-            more_failed_pms.append(pm)
-
-    if more_failed_pms and retry < config.retry_failed_pms_retries:
-        logging.error("%s:%s: Retry: %s -- Failed to send some PMs, another chance to retry will be added.",
-                  identifier, requester, retry)
-        retry += 1
-        date = datetime.datetime.now() + datetime.timedelta(minutes=config.retry_failed_pms_wait_time)
-        job_id = '%s:%s:FAILED_PM_RETRY_%s' % (identifier, requester, retry)
-        scheduler.add_job(retry_failed_pms, 'date', run_date=date, id=job_id,
-                          args=[requester, identifier, more_failed_pms, retry])
-        return
+    logging.info("%s:%s: Moving failed PMs of retry %s to the outbox...", identifier, requester, retry)
+    outbox.enqueue(requester, identifier, failed_pms)
+    drain_outbox()
 
-    if retry >= config.retry_failed_pms_retries:
-        message = ''
-        for pm in more_failed_pms:
-            pm_redditor = pm[0]
-            message += pm_redditor + ', '
-        logging.error("%s:%s: Retry: %s -- Failed to send PMs to the following redditors: %s",
-                  identifier, requester, retry, message)
-        return
+
+def drain_outbox():
+    """ Sends queued PMs now, from the event loop when running on asyncio."""
+    if config.runtime == 'asyncio':
+        scheduler.add_job(outbox.drain_async)
+    else:
+        outbox.drain()
 
 
 def random_winner(requester, identifier, giveaway_args, post):
@@ -206,20 +182,16 @@ def random_winner(requester, identifier, giveaway_args, post):
         Parameters:
             requester:      [string] reddit username
             identifier:     [string] unique 6 digit
-            giveaway_args:  [list] parsed giveaway arguments
+            giveaway_args:  [object] GiveawayArgs of parsed giveaway arguments
             post:           [object] post object from praw
         Returns: winners[list] of reddit usernames [strings] or single reddit username winner[string]
                     -1 if no users found, -3 if error occurred"""
-    num_winners = giveaway_args[6]
-    pkarma = giveaway_args[8]
-    ckarma = giveaway_args[9]
-    days = giveaway_args[10]
+    num_winners = giveaway_args.winners
+    pkarma = giveaway_args.pkarma
+    ckarma = giveaway_args.ckarma
+    days = giveaway_args.days
     winner_list = []
-
-    if pkarma > 0 or ckarma > 0 or days > 0:
-        check_accounts = True
-    else:
-        check_accounts = False
+    check_accounts = giveaway_args.check_accounts()
 
     logging.info("%s:%s: Picking random winners, need: %s", identifier, requester, num_winners)
 
@@ -234,43 +206,32 @@ def random_winner(requester, identifier, giveaway_args, post):
                       identifier, requester)
             return -3
         else:
+            if len(all_comments) < num_winners:
+                logging.warning("%s:%s: Not enough winners found, required: %s, found: %s. Ending <random_winner> process.",
+                            identifier, requester, num_winners, len(all_comments))
+                return -2
+            # shuffle all entries once, the draw order is then kept for account checks
+            winner = random.sample(list(all_comments), len(all_comments))
             if check_accounts:
                 logging.info("%s:%s: Start check_accounts process...", identifier, requester)
-                new_winner = 0
-                while len(winner_list) < num_winners:
-                    if not all_comments:
-                        logging.warning("%s:%s: Not enough winners with valid accounts found, required: %s, found: %s."
-                                    " Ending <random_winner> process.", identifier, requester, num_winners,
-                                    len(winner_list))
-                        return -4
-                    if new_winner > 0:
-                        winner = random.sample(list(all_comments), new_winner)
-                        new_winner = 0  # new winners already picked so reset
-                    else:
-                        winner = random.sample(list(all_comments), num_winners)
-                    for comment in winner:
-                        author = str(all_comments[comment].author)
-                        logging.info("%s:%s: Checking account: %s", identifier, requester, author)
-                        valid = reddit.check_account(all_comments[comment].author, pkarma, ckarma, days,
-                                                         identifier, requester)
-                        if valid is not None:
-                            if valid:
-                                winner_list.append(author)
-                                logging.info("%s:%s: Redditor added to winners list: %s", identifier, requester, author)
-                                del all_comments[comment]
-                            else:
-                                logging.info("%s:%s: Redditor removed from possible winners: %s",
-                                         identifier, requester, author)
-                                del all_comments[comment]
-                                new_winner += 1
-                        else:
-                            logging.error("%s:%s: Error during account check. Ending <random_winner> process.",
-                                      identifier, requester)
-                            return -3
+                valid = reddit.check_accounts([all_comments[comment].author for comment in winner], num_winners,
+                                              pkarma, ckarma, days, identifier, requester)
+                if valid is None:
+                    logging.error("%s:%s: Error during account check. Ending <random_winner> process.",
+                              identifier, requester)
+                    return -3
+                for redditor in valid:
+                    author = str(redditor)
+                    winner_list.append(author)
+                    logging.info("%s:%s: Redditor added to winners list: %s", identifier, requester, author)
+                if len(winner_list) < num_winners:
+                    logging.warning("%s:%s: Not enough winners with valid accounts found, required: %s, found: %s."
+                                " Ending <random_winner> process.", identifier, requester, num_winners,
+                                len(winner_list))
+                    return -4
                 logging.info("%s:%s: End of check_accounts process.", identifier, requester)
             else:
-                winner = random.sample(list(all_comments), num_winners)
-                for comment in winner:
+                for comment in winner[:num_winners]:
                     author = str(all_comments[comment].author)
                     winner_list.append(author)
                     logging.info("%s:%s: Redditor added to winners list: %s", identifier, requester, author)
@@ -289,29 +250,26 @@ def pick_winner(requester, identifier, giveaway_args, post):
         Parameters:
             requester:      [string] reddit username
             identifier:     [string] unique 6 digit
-            giveaway_args:  [list] parsed giveaway arguments
+            giveaway_args:  [object] GiveawayArgs of parsed giveaway arguments
             post:           [object] post from praw
         Returns: winners[list] of reddit usernames [strings] or single reddit username winner[string]
                 winner_comment[list] of winning numbers / matched keywords or single matched number/keyword[string]
                 Errors: -1 if 0 comments /-2 not enough winners found/ -3 if exception API/connection"""
-    giveaway_type = giveaway_args[0]
-    guessnum = giveaway_args[2]
-    minnum = giveaway_args[3]
-    maxnum = giveaway_args[4]
-    keyword = giveaway_args[5]
-    num_winners = giveaway_args[6]
-    pkarma = giveaway_args[8]
-    ckarma = giveaway_args[9]
-    days = giveaway_args[10]
-
-    if pkarma > 0 or ckarma > 0 or days > 0:
-        check_accounts = True
-    else:
-        check_accounts = False
+    giveaway_type = giveaway_args.giveaway_type
+    guessnum = giveaway_args.guessnum
+    minnum = giveaway_args.minnum
+    maxnum = giveaway_args.maxnum
+    keyword = giveaway_args.keyword
+    num_winners = giveaway_args.winners
+    pkarma = giveaway_args.pkarma
+    ckarma = giveaway_args.ckarma
+    days = giveaway_args.days
+    check_accounts = giveaway_args.check_accounts()
 
     logging.info("%s:%s: Picking %s winners, need: %s", identifier, requester, giveaway_type, num_winners)
 
-    possible_winners = {}
+    possible_winners = collections.OrderedDict()
+    used_numbers = set()
     winner = []
     winner_comment = {}
     keyword_winners = collections.OrderedDict()
@@ -320,12 +278,12 @@ def pick_winner(requester, identifier, giveaway_args, post):
 
     if all_comments == -1:  # No comments / users found
         logging.warning("%s:%s: 0 comments found in post. Ending <pick_winner> process.", identifier, requester)
-        return -1
+        return -1, None
     else:
         if not all_comments:
             logging.error("%s:%s: all_comments = False | Something went wrong. Ending <pick_winner> process.",
                       identifier, requester)
-            return -3
+            return -3, None
         else:
             if giveaway_type == 'number':
                 # extract numbers from comments
@@ -333,13 +291,12 @@ def pick_winner(requester, identifier, giveaway_args, post):
                 for key in all_comments:
                     comment = all_comments[key]
                     author = comment.author
-                    body = comment.body
-                    found = re.search("(\d+)", body)
-                    if found is not None:
-                        number = int(found.group(0))  # select first number that was found
-                        if minnum <= number <= maxnum or minnum is 0 and maxnum is 0:
+                    number = comment.number  # first number of the whole comment
+                    if number is not None:
+                        if minnum <= number <= maxnum or minnum == 0 and maxnum == 0:
                             # check to see if someone else already got that number
-                            if number not in possible_winners.values():
+                            if number not in used_numbers:
+                                used_numbers.add(number)
                                 possible_winners[author] = number
                                 logging.debug("%s:%s: Comment: %s - %s - %s", identifier, requester,
                                           datetime.datetime.fromtimestamp(comment.created_utc), author, number)
@@ -367,50 +324,33 @@ def pick_winner(requester, identifier, giveaway_args, post):
                     if check_accounts:
                         logging.info("%s:%s: Picking closest numbers as winners...", identifier, requester)
                         logging.info("%s:%s: Start check_accounts process...", identifier, requester)
-                        while len(winner) < num_winners:
-                            if not possible_winners:
-                                logging.warning("%s:%s: List of possible winners exhausted. Ending <pick_winner> process.",
-                                            identifier, requester)
-                                return -4, None
-                            temp_winner = min(possible_winners, key=lambda y: abs(int(possible_winners[y]) - guessnum))
-                            inverted_possible_winners = {}
-                            for key, value in possible_winners.items():
-                                inverted_possible_winners[value] = key
-                            value = possible_winners.get(temp_winner, None)
-                            author_account = inverted_possible_winners[value]
-                            author = str(inverted_possible_winners[value])
-                            logging.info("%s:%s: Checking account: %s", identifier, requester, author)
-                            valid = reddit.check_account(author_account, pkarma, ckarma, days,
-                                                             identifier, requester)
-                            if valid is not None:
-                                if valid:
-                                    winner.append(author)
-                                    winner_comment[author] = value
-                                    logging.info("%s:%s: Redditor added to winners list: %s, Number: %s", identifier,
-                                             requester, author, value)
-                                    del possible_winners[temp_winner]
-                                else:
-                                    logging.info("%s:%s: Redditor removed from possible winners: %s",
-                                             identifier, requester, author)
-                                    del possible_winners[temp_winner]
-                            else:
-                                logging.error("%s:%s: Error during account check. Ending <pick_winner> process.",
-                                          identifier, requester)
-                                return -3
+                        # candidates are ranked lazily, only as many as the account checks ask for
+                        valid = reddit.check_accounts(closest_numbers(possible_winners, guessnum), num_winners,
+                                                      pkarma, ckarma, days, identifier, requester)
+                        if valid is None:
+                            logging.error("%s:%s: Error during account check. Ending <pick_winner> process.",
+                                      identifier, requester)
+                            return -3, None
+                        for author_account in valid:
+                            author = str(author_account)
+                            value = possible_winners[author_account]
+                            winner.append(author)
+                            winner_comment[author] = value
+                            logging.info("%s:%s: Redditor added to winners list: %s, Number: %s", identifier,
+                                     requester, author, value)
+                        if len(winner) < num_winners:
+                            logging.warning("%s:%s: List of possible winners exhausted. Ending <pick_winner> process.",
+                                        identifier, requester)
+                            return -4, None
                         logging.info("%s:%s: End of check_accounts process.", identifier, requester)
                     else:
                         logging.info("%s:%s: Picking closest numbers as winners...", identifier, requester)
-                        while len(winner) < num_winners:
-                            temp_winner = min(possible_winners, key=lambda y: abs(int(possible_winners[y]) - guessnum))
-                            # invert possible winners to match number (which is unique) to reddit account object
-                            inverted_possible_winners = {}
-                            for key, value in possible_winners.items():
-                                inverted_possible_winners[value] = key
-                            value = possible_winners.get(temp_winner, None)
-                            author = str(inverted_possible_winners[value])
+                        for author_account in itertools.islice(closest_numbers(possible_winners, guessnum),
+                                                               num_winners):
+                            author = str(author_account)
+                            value = possible_winners[author_account]
                             winner.append(author)
                             winner_comment[author] = value
-                            del possible_winners[temp_winner]
                             logging.info("%s:%s: Redditor added to winners list: %s, Number: %s",
                                      identifier, requester, author, value)
                     logging.info("%s:%s: Completed, OK, winners: %s", identifier, requester, winner)
@@ -452,32 +392,23 @@ def pick_winner(requester, identifier, giveaway_args, post):
                     if check_accounts:
                         logging.info("%s:%s: Pick first matching comments as winners...", identifier, requester)
                         logging.info("%s:%s: Start check_accounts process...", identifier, requester)
-                        while len(winner) < num_winners:
-                            if not keyword_winners_list:
-                                logging.warning("%s:%s: List of possible winners exhausted. Ending <pick_winner> process.",
-                                            identifier, requester)
-                                return -4, None
-                            author, match = keyword_winners_list[0]
-                            author_account = author
-                            author = str(author)
-                            logging.info("%s:%s: Checking account: %s", identifier, requester, author)
-                            valid = reddit.check_account(author_account, pkarma, ckarma, days,
-                                                             identifier, requester)
-                            if valid is not None:
-                                if valid:
-                                    winner.append(author)
-                                    winner_comment[author] = match
-                                    logging.info("%s:%s: Redditor added to winners list: %s, Match: %s", identifier,
-                                             requester, author, match)
-                                    del keyword_winners_list[0]
-                                else:
-                                    logging.info("%s:%s: Redditor removed from possible winners: %s", identifier,
-                                             requester, author)
-                                    del keyword_winners_list[0]
-                            else:
-                                logging.error("%s:%s: Error during account check. Ending <pick_winner> process.",
-                                          identifier, requester)
-                                return -3
+                        valid = reddit.check_accounts([author for author, match in keyword_winners_list], num_winners,
+                                                      pkarma, ckarma, days, identifier, requester)
+                        if valid is None:
+                            logging.error("%s:%s: Error during account check. Ending <pick_winner> process.",
+                                      identifier, requester)
+                            return -3, None
+                        for author_account in valid:
+                            author = str(author_account)
+                            match = keyword_winners[author_account]
+                            winner.append(author)
+                            winner_comment[author] = match
+                            logging.info("%s:%s: Redditor added to winners list: %s, Match: %s", identifier,
+                                     requester, author, match)
+                        if len(winner) < num_winners:
+                            logging.warning("%s:%s: List of possible winners exhausted. Ending <pick_winner> process.",
+                                        identifier, requester)
+                            return -4, None
                         logging.info("%s:%s: End of check_accounts process.", identifier, requester)
                     else:
                         logging.info("%s:%s: Pick first matching comments as winners...", identifier, requester)
@@ -493,6 +424,37 @@ def pick_winner(requester, identifier, giveaway_args, post):
                     return winner, winner_comment
 
 
+def closest_numbers(possible_winners, guessnum):
+    """ Ranks number giveaway entries by distance to the number to guess, closest first.
+        Numbers are sorted once and walked outwards from the guess with two pointers, so taking the first k entries
+        costs O(n log n + k). Ties (8->6<-4) go to whoever commented first.
+        Parameters:
+            possible_winners:   [OrderedDict] of reddit user [object] -> unique number, oldest comment first
+            guessnum:           [int] number to guess
+        Returns: generator of reddit users [object]"""
+    order = dict((author, index) for index, author in enumerate(possible_winners))
+    ranked = sorted(possible_winners.items(), key=lambda x: x[1])
+    numbers = [number for author, number in ranked]
+    high = bisect.bisect_left(numbers, guessnum)
+    low = high - 1
+    while low >= 0 or high < len(ranked):
+        if high >= len(ranked):
+            take_low = True
+        elif low < 0:
+            take_low = False
+        else:
+            low_distance = guessnum - numbers[low]
+            high_distance = numbers[high] - guessnum
+            take_low = low_distance < high_distance or \
+                low_distance == high_distance and order[ranked[low][0]] < order[ranked[high][0]]
+        if take_low:
+            yield ranked[low][0]
+            low -= 1
+        else:
+            yield ranked[high][0]
+            high += 1
+
+
 def parse_codes(codes_input, message_id, requester):
     """ Extracts codes.
         Parameters:
@@ -536,11 +498,6 @@ def parse_codes(codes_input, message_id, requester):
         return codes
 
 
-def gen_code():
-    """ Generates random 6 digit code used as 'identifier' to track and identify giveaways."""
-    return random.randint(100000, 999999)
-
-
 def end_job(identifier, reason):
     """ Ends apscheduler job."""
     if scheduler.get_job(identifier) is not None:
@@ -550,151 +507,106 @@ def end_job(identifier, reason):
         logging.warning("%s: Job not found", identifier)
 
 
+class ParseError(ValueError):
+    """ Raised by parse_pm when a giveaway message can't be parsed, the message is the reason given to the requester."""
+
+
+# giveaway message: "type[:settings], when to run, [winners], [pkarma:N], [ckarma:N], [days:N], codes"
+_type_pattern = re.compile(r'(random|number|keyword)\b\s*:?\s*(.*)$', re.IGNORECASE | re.DOTALL)
+_numbers_pattern = re.compile(r'([0-9]+)\s*:\s*([0-9]+)\s*:\s*([0-9]+)$')
+_winners_pattern = re.compile(r'[0-9]+$')
+_option_pattern = re.compile(r'(pkarma|ckarma|days)\s*:\s*(.*)$', re.IGNORECASE | re.DOTALL)
+
+
+def _type_settings(giveaway_type, settings):
+    """ Returns: [dict] of guessnum, minnum, maxnum or keyword from what follows the giveaway type"""
+    if giveaway_type == 'number':
+        found = _numbers_pattern.match(settings)
+        if not found:
+            raise ParseError('number giveaways need the number to guess and the range, e.g. number:123:0:1000')
+        guessnum, minnum, maxnum = (int(x) for x in found.groups())
+        if minnum > maxnum:
+            raise ParseError('the number range %s:%s is backwards' % (minnum, maxnum))
+        return {'guessnum': guessnum, 'minnum': minnum, 'maxnum': maxnum}
+    if giveaway_type == 'keyword':
+        keyword = settings.strip().lower()
+        if not keyword:
+            raise ParseError('keyword giveaways need a keyword, e.g. keyword:lolipop')
+        return {'keyword': keyword}
+    return {}
+
+
 def parse_pm(content, requester, message_id):
     """ Parses PM content.
         Parameters:
             content:    [string] PM message body
             requester:  [string] request author
             message_id:         [string] message id
-        Returns: giveaway_args[list] of parsed giveaway arguments
-                None if parsing fails"""
+        Returns: giveaway_args[object] GiveawayArgs of parsed giveaway arguments
+        Raises: ParseError if the message is not a valid giveaway"""
     logging.info("%s:%s: Parsing message content...", message_id, requester)
 
-    giveaway_types = ['random', 'number', 'keyword']
-    guessnum = None  # number to guess (number giveaway)
-    minnum = None  # min number (number giveaway)
-    maxnum = None  # max number (number giveaway)
-    keyword = None  # keyword (keyword giveaway)
-    winners = 1  # number of possible winners (1 default)
-    is_mention = False  # is a user mention message?
-    pkarma = 0  # winner account post karma check?
-    ckarma = 0  # winner account comment karma check?
-    days = 0  # winner account days check?
-
-    if "/u/autogiveaway" in content:
+    is_mention = "/u/autogiveaway" in content  # is a user mention message?
+    if is_mention:
         content = content.replace("/u/autogiveaway", "")
-        is_mention = True
+    args = [x.strip() for x in content.split(',')]
 
-    tmp_args = content.split(',')  # separate content
-    tmp_args = [x.strip() for x in tmp_args]  # remove beginning and trailing white spaces
-
-    first_arg = tmp_args[0].lower()  # grab first arg to figure out what we are dealing with
-    found = re.search("((?:[a-z][a-z]+))", first_arg)  # find words only
+    found = _type_pattern.match(args[0])
     if found:
-        giveaway_type = found.group(0)  # select first word that was found
+        giveaway_type = found.group(1).lower()
+        settings = _type_settings(giveaway_type, found.group(2))
+        del args[0]
+    elif is_mention:
+        raise ParseError('unknown giveaway type "%s", use random, number or keyword' % args[0])
+    else:  # no type specified, just do random, first arg is when to run
+        giveaway_type = 'random'
+        settings = {}
+
+    if is_mention:
+        date = datetime.datetime.now()
     else:
-        logging.warning("%s:%s: No words found, found = None. Ending <parse_pm> process.", message_id, requester)
-        return None
-
-    if giveaway_type in giveaway_types:
-        # if type 'number' then extract the numbers
-        if giveaway_type == 'number':
-            tmp = first_arg.split(':')
-            guessnum = int(tmp[1])
-            minnum = int(tmp[2])
-            maxnum = int(tmp[3])
-            if guessnum < 0 or minnum < 0 or maxnum < 0:
-                logging.warning("%s:%s: No valid numbers found for number giveaway. Ending <parse_pm> process.",
-                            message_id, requester)
-                return None
-        # if type 'keyword' then extract the keyword
-        if giveaway_type == 'keyword':
-            tmp = first_arg.split(':')
-            keyword = tmp[1].strip().lower()
-            if not keyword:
-                logging.warning("%s:%s: No keyword found for keyword giveaway provided. Ending <parse_pm> process.",
-                            message_id, requester)
-                return None
-        if is_mention:
-            # remove giveaway type and give current date & time
-            date = datetime.datetime.now()
-            tmp_args.remove(tmp_args[0])
-        else:
-            # get date and parse it
-            date = dateparser.parse(tmp_args[1],
-                                    settings={'TIMEZONE': 'UTC', 'TO_TIMEZONE': 'UTC', 'STRICT_PARSING': True,
-                                              'DATE_ORDER': 'MDY'})
-            if not date or date < (datetime.datetime.now()):
-                logging.warning("%s:%s: Bad date provided. Ending <parse_pm> process.", message_id, requester)
-                return None
-            # remove date args from tmp_args
-            tmp_args.remove(tmp_args[0])
-            tmp_args.remove(tmp_args[0])
-        # process rest of args
-        argcnt = 0  # track how many args we run through
-        for arg in tmp_args:
-            if arg.isdigit():
-                winners = int(arg)
-                argcnt += 1
-            if 'pkarma:' in arg.lower():
-                tmp = arg.split(':')
-                try:
-                    pkarma = int(tmp[1])
-                except IndexError as error:
-                    logging.error("%s:%s: pkarma value not found. Error: %s", message_id, requester, error)
-                    return None
-                argcnt += 1
-            if 'ckarma:' in arg.lower():
-                tmp = arg.split(':')
-                try:
-                    ckarma = int(tmp[1])
-                except IndexError as error:
-                    logging.error("%s:%s: ckarma value not found. Error: %s", message_id, requester, error)
-                    return None
-                argcnt += 1
-            if 'days:' in arg.lower():
-                tmp = arg.split(':')
-                try:
-                    days = int(tmp[1])
-                except IndexError as error:
-                    logging.error("%s:%s: days value not found. Error: %s", message_id, requester, error)
-                    return None
-                argcnt += 1
-        # remove processed args from tmp_args to leave only the codes
-        if argcnt > 0:
-            del tmp_args[0:argcnt]
-        if is_mention:
-            giveaway_args = [giveaway_type, date, guessnum, minnum, maxnum, keyword, winners, is_mention, pkarma,
-                             ckarma, days]
-            logging.info("%s:%s: Return: \"%s\"", message_id, requester, giveaway_args)
-        else:
-            giveaway_args = [giveaway_type, date, guessnum, minnum, maxnum, keyword, winners, is_mention, pkarma,
-                             ckarma, days, tmp_args]
-            codes = tmp_args[0]
-            # Check if leftover values actually look like codes
-            #if '-' not in codes:
-             #   logging.error("%s:%s: No dashes '-' found in codes string.", message_id, requester)
-             #   return None
-            logging.info("%s:%s: Return: \"%s %s\"", message_id, requester, giveaway_args[0:11], obfuscate(codes))
-        return giveaway_args
-    else:  # no type specified, just do random
-        # check to see if first arg is a date or time
-        date = dateparser.parse(tmp_args[0],
-                                settings={'TIMEZONE': 'UTC', 'TO_TIMEZONE': 'UTC', 'STRICT_PARSING': True,
-                                          'DATE_ORDER': 'MDY'})
-        if date and not date < (datetime.datetime.now()):
-            giveaway_type = 'random'  # set to default random giveaway
-            tmp_args.remove(tmp_args[0])  # remove date
-            giveaway_args = [giveaway_type, date, guessnum, minnum, maxnum, keyword,
-                             winners, is_mention, pkarma, ckarma, days, tmp_args]
-            if not tmp_args:
-                logging.warning("%s:%s: No codes provided. Ending <parse_pm> process.", message_id, requester)
-                return None
-            codes = tmp_args[0]
-            logging.info("%s:%s: Return: \"%s %s\"", message_id, requester, giveaway_args[0:11], obfuscate(codes))
-            return giveaway_args
-        else:
-            logging.warning("%s:%s: No valid input to parse or bad date provided. Ending <parse_pm> process.",
-                        message_id, requester)
-            return None
+        if not args:
+            raise ParseError('missing when to run the giveaway')
+        date = dates.parse(args[0])
+        if not date or date < dates.now():
+            raise ParseError('"%s" is not a date in the future' % args[0])
+        del args[0]
+
+    # optional winners and account checks, the first other argument is the codes
+    codes = None
+    for arg in args:
+        if _winners_pattern.match(arg):
+            settings['winners'] = int(arg)
+            continue
+        found = _option_pattern.match(arg)
+        if found:
+            if not _winners_pattern.match(found.group(2).strip()):
+                raise ParseError('%s needs a number, e.g. %s:50' % (found.group(1).lower(), found.group(1).lower()))
+            settings[found.group(1).lower()] = int(found.group(2))
+            continue
+        codes = arg
+        break
+    if settings.get('winners', 1) < 1:
+        raise ParseError('there must be at least one winner')
+
+    if is_mention:
+        giveaway_args = GiveawayArgs(giveaway_type, date, is_mention=True, **settings)
+        logging.info("%s:%s: Return: \"%s\"", message_id, requester, giveaway_args)
+    else:
+        if not codes:
+            raise ParseError('no codes provided')
+        giveaway_args = GiveawayArgs(giveaway_type, date, codes=codes, **settings)
+        logging.info("%s:%s: Return: \"%s %s\"", message_id, requester, giveaway_args, obfuscate(codes))
+    return giveaway_args
 
 
 def update_numbers(requester, identifier, giveaway_args, post, bot_comment):
-    """ Updates a comment with the numbers from the top comments in a numbers giveaway post."""
-    numbers = []
-    string_numbers = ''
-    min_num = giveaway_args[3]
-    max_num = giveaway_args[4]
+    """ Updates a comment with the numbers from the top comments in a numbers giveaway post.
+        Only comments harvested since the previous update are scanned, the comment is only edited when new numbers
+        were used."""
+    giveaway_args = GiveawayArgs.from_list(giveaway_args)  # jobs scheduled by older versions pass a list
+    min_num = giveaway_args.minnum
+    max_num = giveaway_args.maxnum
 
     logging.info("%s:%s: Updating numbers used in giveaway...", identifier, requester)
     # get all top level comments
@@ -709,25 +621,29 @@ def update_numbers(requester, identifier, giveaway_args, post, bot_comment):
                       identifier, requester)
             return
         else:
-            # extract numbers from comments
-            logging.info("%s:%s: Extracting numbers from comments...", identifier, requester)
-            for key in all_comments:
-                comment = all_comments[key]
+            numbers = used_numbers.get(identifier)
+            if numbers is None:
+                numbers = used_numbers[identifier] = UsedNumbers(min_num, max_num)
+            # extract numbers from new comments only, new authors are always appended to the comment index
+            logging.info("%s:%s: Extracting numbers from %s new comments...", identifier, requester,
+                         len(all_comments) - numbers.ingested)
+            for comment in itertools.islice(all_comments.values(), numbers.ingested, None):
                 author = comment.author
-                body = comment.body
-                found = re.search("(\d+)", body)
-                if found is not None:
-                    number = int(found.group(0))  # select first number that was found
+                number = comment.number  # first number of the whole comment
+                if number is not None:
                     if min_num <= number <= max_num:
-                        numbers.append(number)
+                        numbers.add(number)
                         logging.debug("%s:%s: Comment from: %s, Number: %s", identifier, requester, author, number)
                 else:
                     logging.debug("%s:%s: Comment from: %s, No number found.", identifier, requester, author)
+            numbers.ingested = len(all_comments)
 
-            tmp_set = set(numbers)
-            unique_numbers = sorted(list(tmp_set))
-            for x in unique_numbers:
-                string_numbers += '%s, ' % str(x)
+            # pastes expire after an hour, unchanged numbers are still published again before that
+            if not numbers.changed() and datetime.datetime.now() - numbers.published_at < \
+                    datetime.timedelta(minutes=config.update_numbers_republish):
+                logging.info("%s:%s: No new numbers used, comment left as is. Completed, OK", identifier, requester)
+                return
+            string_numbers = format_numbers(numbers)
 
             # get old pastebin code to delete it
             old_comment = reddit.get_comment(bot_comment.id)
@@ -752,10 +668,31 @@ def update_numbers(requester, identifier, giveaway_args, post, bot_comment):
                 .format(pastebin_url, config.update_numbers_interval)
 
             logging.info("%s:%s: Updating giveaway comment with new pastebin link...", identifier, requester)
-            reddit.edit_comment(bot_comment, message, identifier, requester)
+            edited = reddit.edit_comment(bot_comment, message, identifier, requester)
+            if edited and edited is not retry.DEFERRED:  # only once the comment shows the new link
+                numbers.mark_published(datetime.datetime.now())
             logging.info("%s:%s: Completed, OK", identifier, requester)
 
 
+def format_numbers(numbers):
+    """ Renders the used numbers of a number giveaway for pastebin.
+        Consecutive numbers are collapsed into ranges ("1-250, 300, 402-410"), once more than
+        config.update_numbers_free_ratio of the range is used only the numbers still free are listed.
+        Parameters:
+            numbers:    [object] UsedNumbers of the giveaway
+        Returns: [string]"""
+    if not config.update_numbers_compact:
+        return ', '.join(str(x) for x in numbers)
+    if len(numbers) > (numbers.max_num - numbers.min_num + 1) * config.update_numbers_free_ratio:
+        return 'Numbers still free: ' + format_ranges(numbers.free_ranges())
+    return 'Numbers already used: ' + format_ranges(numbers.ranges())
+
+
+def format_ranges(ranges):
+    """ Collapses (first, last) ranges into a "1-250, 300, 402-410" string."""
+    return ', '.join(str(first) if first == last else '%s-%s' % (first, last) for first, last in ranges)
+
+
 def obfuscate(codes_string):
     """ Obfuscates codes in the log files"""
     codes = ''
@@ -788,10 +725,25 @@ def comment_permalink(comment):
     return permalink
 
 
+def pastebin_api():
+    """ Returns: [object] PastebinAPI, created on first use"""
+    global pastebin
+    if pastebin is None:
+        pastebin = PastebinAPI()
+    return pastebin
+
+
+def use_pastebin(backend):
+    """ Makes pastebin_paste / pastebin_delete go through backend instead of PastebinAPI, an object with the same
+        paste() and delete_paste() methods."""
+    global pastebin
+    pastebin = backend
+
+
 def pastebin_paste(text, title, paste_format, expiration, identifier):
     """ Creates a new paste page in pastebin.com under user: autogiveaway
         Returns: URL of paste"""
-    paste_url = pastebin.paste(
+    paste_url = pastebin_api().paste(
         auth.pastebin_api_dev_key,
         text,
         api_user_key=auth.pastebin_api_user_key,
@@ -808,7 +760,7 @@ def pastebin_paste(text, title, paste_format, expiration, identifier):
 def pastebin_delete(code, identifier):
     """ Deletes pastebin pages"""
     logging.info("%s: Deleting pastebin.com/%s", identifier, code)
-    pastebin.delete_paste(
+    pastebin_api().delete_paste(
         auth.pastebin_api_dev_key,
         auth.pastebin_api_user_key,
         code